@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import html
+import io
+import mimetypes
+import os
+import re
+from urllib.parse import unquote_to_bytes, urljoin
+
+from instrumentation import metrics
+
+IMG_SRC = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]*)(")')
+DATA_URI = re.compile(r"data:(?P<type>[\w/+.-]+)?(?P<params>(?:;[^;,]*)*?)(?P<base64>;base64)?,(?P<data>.*)", re.S)
+EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/svg+xml": ".svg",
+    "image/webp": ".webp",
+}
+# Formats Pillow can re-encode without changing how the diagram looks
+REENCODE_FORMATS = {"image/png": "PNG", "image/jpeg": "JPEG"}
+
+ASSET_DIR = os.path.join("..", "site", "static", "diagrams")
+ASSET_URL = "/diagrams"
+
+
+class AssetStore:
+    """
+    Content-addressed store for the images embedded in or linked from question HTML
+
+    Every image is written once to `directory` as <sha256 of the original bytes>.<ext>, so a
+    diagram reused across years or by Gauss 7 and 8 is stored a single time, and the HTML
+    is rewritten to load it from `url_prefix` instead of carrying it inline as a data: URI
+    (or hot-linking the CEMC site). Names are derived from the original bytes, so rebuilding
+    never re-encodes an image that is already stored
+
+    With `reencode` set, PNG/JPEG images are re-encoded (and downscaled to `max_width`
+    pixels wide, when given) with Pillow, keeping the original whenever it is smaller
+    Remote images are fetched through `fetcher` (a fetcher.Fetcher); without one they are left as is
+    """
+
+    def __init__(self, directory=ASSET_DIR, url_prefix=ASSET_URL, fetcher=None, reencode=False, max_width=None):
+        if reencode:
+            try:
+                import PIL.Image  # noqa: F401
+            except ImportError:
+                raise ImportError("Re-encoding images needs Pillow: pip install Pillow")
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self.fetcher = fetcher
+        self.reencode = reencode
+        self.max_width = max_width
+        os.makedirs(directory, exist_ok=True)
+
+    def _encode(self, data, content_type):
+        from PIL import Image
+
+        image = Image.open(io.BytesIO(data))
+        if self.max_width and image.width > self.max_width:
+            height = round(image.height * self.max_width / image.width)
+            image = image.resize((self.max_width, height), Image.LANCZOS)
+        output = io.BytesIO()
+        if content_type == "image/jpeg":
+            image.save(output, "JPEG", quality=85, optimize=True, progressive=True)
+        else:
+            image.save(output, "PNG", optimize=True)
+        return output.getvalue()
+
+    def store(self, data, content_type):
+        """
+        Store image bytes and return the url the HTML should use for them
+        """
+        name = hashlib.sha256(data).hexdigest()[:20] + EXTENSIONS.get(content_type, mimetypes.guess_extension(content_type or "") or "")
+        path = os.path.join(self.directory, name)
+        metrics.count("asset_bytes_before", len(data))
+        if os.path.exists(path):
+            metrics.count("assets_deduplicated")
+            metrics.count("asset_bytes_after", os.path.getsize(path))
+            return f"{self.url_prefix}/{name}"
+
+        if self.reencode and content_type in REENCODE_FORMATS:
+            encoded = self._encode(data, content_type)
+            if len(encoded) < len(data):
+                data = encoded
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        metrics.count("assets_stored")
+        metrics.count("asset_bytes_after", len(data))
+        return f"{self.url_prefix}/{name}"
+
+    def load(self, src, page_url=None):
+        """
+        (bytes, content type) of an <img> src, or None when it cannot be read
+        """
+        match = DATA_URI.match(src)
+        if match:
+            payload = match.group("data")
+            data = base64.b64decode(payload) if match.group("base64") else unquote_to_bytes(payload)
+            return data, match.group("type") or "text/plain"
+        if self.fetcher is None or src.startswith(self.url_prefix + "/"):
+            return None
+        url = urljoin(page_url or "", src)
+        if not url.startswith(("http://", "https://")):
+            return None
+        content_type = mimetypes.guess_type(url)[0]
+        return self.fetcher.get_bytes(url), content_type
+
+    def rewrite_html(self, fragment, page_url=None):
+        """
+        Point every <img> of an HTML fragment at its stored copy
+        """
+        def replace(match):
+            src = html.unescape(match.group(2))
+            try:
+                loaded = self.load(src, page_url)
+            except Exception as e:
+                metrics.count("asset_errors")
+                print(f"Could not store image {src[:80]}: {e}")
+                return match.group(0)
+            if loaded is None:
+                return match.group(0)
+            return match.group(1) + html.escape(self.store(*loaded)) + match.group(3)
+
+        return IMG_SRC.sub(replace, fragment)
+
+    def rewrite_record(self, record, question_url=None, solution_url=None):
+        """
+        Rewrite the question, answer and solution HTML of a record in place, before compression
+        """
+        record["question"] = self.rewrite_html(record["question"], question_url)
+        record["solutions"]["solution"] = self.rewrite_html(record["solutions"]["solution"], solution_url)
+        if record["answers"]:
+            record["answers"] = [self.rewrite_html(answer, question_url) for answer in record["answers"]]
+        return record
@@ -0,0 +1,234 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+import lxml_parser
+import scrape_question
+from compression import timed_compress
+from fetcher import Fetcher
+from http_cache import HttpCache
+from scrape_solution_pdf import iter_pdf_pages, iter_results_pdf
+
+# Offline benchmark of every build pipeline stage against the checked-in fixtures
+#   python benchmark.py --output bench.json
+#   python benchmark.py --baseline bench.json --tolerance 0.25 --stage-tolerance pdf_extract=0.5
+# Stages are timed separately and report throughput. With --baseline, the run exits with
+# status 1 when a stage is slower than its baseline time by more than the tolerance
+
+# Pascal pages reconstructed from pascal_questions.json, not downloaded from the CEMC site, so parse
+# timings measure their markup; test/fixtures/synthetic holds relabelled pages (see test/fixtures/README.md)
+FIXTURE_DIR = os.path.join("test", "fixtures", "html")
+PDF_GLOB = os.path.join("test", "*.pdf")
+FIXTURE_BASE_URL = "https://fixtures.invalid"
+
+
+def fixture_pages(fixture_dir=FIXTURE_DIR):
+    """
+    (contest, year, contest_html, solution_html) for every contest page in the fixture corpus
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*", "*Contest.html"))):
+        name = os.path.basename(path)
+        year = int(name[:4])
+        contest = name[4:-len("Contest.html")].lower()
+        solution_path = os.path.join(os.path.dirname(path), f"{year}{scrape_question.CONTESTS[contest]['solution']}.html")
+        with open(path, encoding="utf-8") as f:
+            contest_html = f.read()
+        with open(solution_path, encoding="utf-8") as f:
+            solution_html = f.read()
+        pages.append((contest, year, contest_html, solution_html))
+    return pages
+
+
+def timed(function, repeat):
+    """
+    Best wall time of `repeat` runs of function(), and its last result
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_fetch(pages, workdir, repeat):
+    # Prime a cache with the fixture pages, then read them back with the network disabled
+    cache = HttpCache(os.path.join(workdir, "http_cache"), mode="offline")
+    urls = []
+    for contest, year, contest_html, solution_html in pages:
+        contest_url, solution_url = scrape_question.contest_urls(contest, year, FIXTURE_BASE_URL)
+        cache.store(contest_url, contest_html.encode("utf-8"), {})
+        cache.store(solution_url, solution_html.encode("utf-8"), {})
+        urls.extend([contest_url, solution_url])
+    fetcher = Fetcher(workers=1, interval=0, cache=cache)
+    try:
+        seconds, fetched = timed(lambda: [fetcher.get(url) for url in urls], repeat)
+    finally:
+        fetcher.close()
+    size = sum(len(text.encode("utf-8")) for text in fetched)
+    return {"seconds": seconds, "pages": len(urls), "MB/s": size / seconds / 1e6}
+
+
+def bench_parse(pages, parser, repeat):
+    parse_contest, parse_solution = scrape_question.PARSERS[parser]
+
+    def run():
+        parsed = []
+        for contest, year, contest_html, solution_html in pages:
+            index = scrape_question.CONTESTS[contest]["solution_index"]
+            parsed.append((parse_contest(contest_html, year), parse_solution(solution_html, index)))
+        return parsed
+
+    seconds, parsed = timed(run, repeat)
+    count = sum(len(questions) for questions, _ in parsed)
+    return {"seconds": seconds, "questions": count, "questions/s": count / seconds}, parsed
+
+
+def bench_answer_regex(pages, repeat):
+    # The answer paragraphs the solution parser feeds to the regex
+    paragraphs = []
+    for contest, year, contest_html, solution_html in pages:
+        document, body = lxml_parser.body_of(solution_html)
+        ol = [child for child in body if child.tag == "ol"][scrape_question.CONTESTS[contest]["solution_index"]]
+        for li in [child for child in ol if child.tag == "li"][:25]:
+            paragraphs.extend(lxml_parser.to_html(p) for p in li.findall(".//p")[-2:])
+
+    seconds, _ = timed(lambda: [scrape_question.ANSWER_PATTERN.search(p) for p in paragraphs], repeat)
+    return {"seconds": seconds, "matches": len(paragraphs), "matches/s": len(paragraphs) / seconds}
+
+
+def bench_compress(parsed, repeat):
+    # Question then solution for each question, the order the scraper compresses them in
+    payloads = []
+    for questions, solutions in parsed:
+        for (question_html, _), (solution_html, _) in zip(questions, solutions):
+            payloads.extend([question_html, solution_html])
+    seconds, results = timed(lambda: [timed_compress(payload) for payload in payloads], repeat)
+    raw = sum(r[2] for r in results)
+    compressed = sum(r[3] for r in results)
+    return {"seconds": seconds, "payloads": len(payloads), "MB/s": raw / seconds / 1e6,
+            "ratio": compressed / raw if raw else 0}, results
+
+
+def bench_pdf(pdfs, workdir, repeat):
+    pages = {}
+
+    def extract():
+        count = 0
+        for pdf in pdfs:
+            for _ in iter_pdf_pages(pdf, cache_dir=None):
+                count += 1
+        return count
+
+    seconds, count = timed(extract, repeat)
+    pages["pdf_extract"] = {"seconds": seconds, "pages": count, "pages/s": count / seconds if seconds else 0}
+
+    cache_dir = os.path.join(workdir, "pdf_text_cache")
+    for pdf in pdfs:
+        for _ in iter_pdf_pages(pdf, cache_dir):
+            pass
+    seconds, rows = timed(lambda: [row for pdf in pdfs for row in iter_results_pdf(pdf, cache_dir)], repeat)
+    pages["pdf_parse_cached"] = {"seconds": seconds, "rows": len(rows), "rows/s": len(rows) / seconds if seconds else 0}
+    return pages
+
+
+def bench_json_write(parsed, results, workdir, repeat):
+    records = []
+    pairs = [pair for questions, solutions in parsed for pair in zip(questions, solutions)]
+    for i, ((_, answers), (_, ans)) in enumerate(pairs):
+        records.append({
+            "question": results[2 * i][0],
+            "answers": answers,
+            "solutions": {"solution": results[2 * i + 1][0], "ans": ans},
+        })
+    path = os.path.join(workdir, "questions.json")
+
+    def write():
+        with open(path, "w", encoding="utf8") as f:
+            json.dump({"data": records, "legend": {}}, f, indent=4)
+
+    seconds, _ = timed(write, repeat)
+    size = os.path.getsize(path)
+    return {"seconds": seconds, "bytes": size, "MB/s": size / seconds / 1e6}
+
+
+def run(fixture_dir=FIXTURE_DIR, pdf_glob=PDF_GLOB, repeat=3):
+    """
+    Run every stage and return {stage: metrics}; every metrics dict has "seconds"
+    """
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    pages = fixture_pages(fixture_dir)
+    pdfs = sorted(glob.glob(pdf_glob))
+    workdir = tempfile.mkdtemp(prefix="cemc-bench-")
+    try:
+        report = {"fetch_cached": bench_fetch(pages, workdir, repeat)}
+        report["parse_html_bs4"], _ = bench_parse(pages, "bs4", repeat)
+        report["parse_html_lxml"], parsed = bench_parse(pages, "lxml", repeat)
+        report["answer_regex"] = bench_answer_regex(pages, repeat)
+        report["compress"], results = bench_compress(parsed, 1)
+        if pdfs:
+            report.update(bench_pdf(pdfs, workdir, repeat))
+        report["json_write"] = bench_json_write(parsed, results, workdir, repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def regressions(report, baseline, tolerance, stage_tolerance=None):
+    """
+    Stages slower than baseline * (1 + tolerance), as (stage, seconds, baseline seconds)
+    """
+    stage_tolerance = stage_tolerance or {}
+    slower = []
+    for stage, metrics in report.items():
+        if stage not in baseline:
+            continue
+        limit = baseline[stage]["seconds"] * (1 + stage_tolerance.get(stage, tolerance))
+        if metrics["seconds"] > limit:
+            slower.append((stage, metrics["seconds"], baseline[stage]["seconds"]))
+    return slower
+
+
+def print_report(report):
+    for stage, metrics in report.items():
+        details = ", ".join(
+            f"{key} {value:.3g}" if isinstance(value, float) else f"{key} {value}"
+            for key, value in metrics.items() if key != "seconds"
+        )
+        print(f"{stage:18} {metrics['seconds'] * 1000:9.1f}ms  {details}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the build pipeline stages on saved fixtures")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--pdfs", default=PDF_GLOB, help="glob of results PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the best time is kept")
+    parser.add_argument("--output", help="write the results as JSON, e.g. to use as a baseline")
+    parser.add_argument("--baseline", help="JSON from an earlier --output run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown over the baseline, 0.2 = 20%%")
+    parser.add_argument("--stage-tolerance", nargs="*", default=[], metavar="STAGE=TOLERANCE")
+    args = parser.parse_args()
+
+    report = run(args.fixtures, args.pdfs, args.repeat)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        stage_tolerance = {stage: float(value) for stage, value in (s.split("=") for s in args.stage_tolerance)}
+        slower = regressions(report, baseline, args.tolerance, stage_tolerance)
+        for stage, seconds, before in slower:
+            print(f"REGRESSION {stage}: {seconds * 1000:.1f}ms vs {before * 1000:.1f}ms baseline")
+        if slower:
+            sys.exit(1)
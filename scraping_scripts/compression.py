@@ -0,0 +1,67 @@
+import base64
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import brotli
+
+
+def compress(html):
+    """
+    Brotli-compress an HTML fragment and return it as base64 text
+    """
+    compressed = brotli.compress(html.encode("utf-8"), quality=11)
+    return base64.b64encode(compressed).decode("utf-8")
+
+
+def timed_compress(html):
+    """
+    Compress one payload
+    Returns (base64 text, seconds spent, uncompressed bytes, compressed bytes)
+    """
+    start = time.perf_counter()
+    raw = html.encode("utf-8")
+    compressed = brotli.compress(raw, quality=11)
+    encoded = base64.b64encode(compressed).decode("utf-8")
+    return encoded, time.perf_counter() - start, len(raw), len(compressed)
+
+
+def iter_compress(payloads, workers=None):
+    """
+    Compress a list of HTML payloads on a process pool sized to the machine's cores
+    Yields tuples from timed_compress() in the same order as `payloads`, each as soon as it
+    and every payload before it are done
+    workers=1 compresses in this process
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(payloads) < 2:
+        for payload in payloads:
+            yield timed_compress(payload)
+        return
+    chunksize = max(1, len(payloads) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(timed_compress, payloads, chunksize=chunksize)
+
+
+def compress_all(payloads, workers=None):
+    """
+    Compress a list of HTML payloads in parallel; see iter_compress()
+    """
+    return list(iter_compress(payloads, workers))
+
+
+def report(results, wall, labels=None, slowest=5):
+    """
+    Print totals for a compress_all() run and the slowest payloads
+    """
+    if not results:
+        return
+    cpu = sum(r[1] for r in results)
+    raw = sum(r[2] for r in results)
+    compressed = sum(r[3] for r in results)
+    print(f"Compressed {len(results)} payloads: {raw} -> {compressed} bytes, "
+          f"{cpu:.2f}s compress time in {wall:.2f}s wall ({cpu / wall if wall else 0:.1f}x)")
+    labels = labels or [str(i) for i in range(len(results))]
+    order = sorted(range(len(results)), key=lambda i: results[i][1], reverse=True)
+    for i in order[:slowest]:
+        print(f"  {labels[i]}: {results[i][1] * 1000:.1f}ms, {results[i][2]} -> {results[i][3]} bytes")
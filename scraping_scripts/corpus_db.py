@@ -0,0 +1,413 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+
+from json_stream import JsonArrayWriter, detect_indent
+from question_pack import pack_path, write_pack
+
+CORPUS_DB = "contest_data/corpus.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    contest TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    number INTEGER NOT NULL,           -- 0-based, like source.number
+    question TEXT NOT NULL,            -- base64 brotli HTML
+    answers TEXT,                      -- JSON list, NULL for open-ended questions
+    solution TEXT NOT NULL,
+    ans TEXT,
+    hash TEXT,
+    percentage_correct REAL,
+    source_extra TEXT,                 -- JSON of other source fields, e.g. duplicate_group
+    extra TEXT,                        -- JSON of other record fields
+    PRIMARY KEY (contest, year, number)
+);
+CREATE INDEX IF NOT EXISTS questions_difficulty ON questions (contest, percentage_correct);
+
+-- Topic ids per question as in <contest>_id.json; a question without rows has no topic data
+CREATE TABLE IF NOT EXISTS question_topics (
+    contest TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('primary', 'secondary', 'none')),
+    position INTEGER NOT NULL,
+    topic INTEGER,
+    PRIMARY KEY (contest, year, number, kind, position)
+);
+CREATE INDEX IF NOT EXISTS question_topics_topic ON question_topics (contest, topic);
+
+-- primaryMask/secondaryMask of questions whose topic data carries them (files on the shared topic registry)
+CREATE TABLE IF NOT EXISTS question_topic_masks (
+    contest TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    primary_mask TEXT NOT NULL,
+    secondary_mask TEXT NOT NULL,
+    PRIMARY KEY (contest, year, number)
+);
+
+CREATE TABLE IF NOT EXISTS topics (
+    contest TEXT NOT NULL,
+    name TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (contest, name)
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+    contest TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (contest, year)
+);
+
+-- Rows of the results CSVs written by scrape_solution_pdf (question numbers are 1-based there)
+CREATE TABLE IF NOT EXISTS results (
+    contest TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    question INTEGER NOT NULL,
+    correct_answer TEXT,
+    percentage_correct REAL,
+    contestants INTEGER,
+    average_mark REAL,
+    source TEXT,
+    PRIMARY KEY (contest, year, question)
+);
+"""
+
+QUESTION_FIELDS = ("question", "answers", "solutions", "topics", "source", "percentage_correct")
+
+
+class CorpusStore:
+    """
+    SQLite store for the question corpus, its topic ids and the contest results
+
+    Scrapers and the PDF parser upsert into it as they go; the JSON files the site reads
+    (and the .pack files) are regenerated from it with the export_* methods
+    Contest names are lower case ("pascal"), as in contest_data/
+    """
+
+    def __init__(self, path=CORPUS_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.connection.commit()
+        self.close()
+
+    def commit(self):
+        self.connection.commit()
+
+    def upsert_questions(self, contest, records):
+        """
+        Insert or replace question records (as in <contest>_questions.json "data"), with their topics
+        """
+        count = 0
+        for record in records:
+            source = dict(record["source"])
+            year = source.pop("year")
+            number = source.pop("number")
+            extra = {k: v for k, v in record.items() if k not in QUESTION_FIELDS}
+            self.connection.execute(
+                "INSERT OR REPLACE INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    contest, year, number, record["question"],
+                    None if record["answers"] is None else json.dumps(record["answers"]),
+                    record["solutions"]["solution"], record["solutions"]["ans"], source.pop("hash", None),
+                    record.get("percentage_correct"),
+                    json.dumps(source) if source else None,
+                    json.dumps(extra) if extra else None,
+                ),
+            )
+            self.set_question_topics(contest, year, number, record.get("topics"))
+            count += 1
+        return count
+
+    def set_question_topics(self, contest, year, number, topics):
+        for table in ("question_topics", "question_topic_masks"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE contest = ? AND year = ? AND number = ?", (contest, year, number)
+            )
+        if topics is None:
+            return
+        if "primaryMask" in topics:
+            self.connection.execute(
+                "INSERT INTO question_topic_masks VALUES (?, ?, ?, ?, ?)",
+                (contest, year, number, topics["primaryMask"], topics["secondaryMask"]),
+            )
+        rows = [(contest, year, number, "primary", i, t) for i, t in enumerate(topics.get("primaryTopics", []))]
+        rows += [(contest, year, number, "secondary", i, t) for i, t in enumerate(topics.get("secondaryTopics", []))]
+        if not rows:
+            # Topic data that lists no topics, as opposed to no topic data
+            rows = [(contest, year, number, "none", 0, None)]
+        self.connection.executemany("INSERT INTO question_topics VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def set_sources(self, contest, sources):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+            [(contest, int(year), digest) for year, digest in sources.items()],
+        )
+
+    def set_legend(self, contest, legend):
+        self.connection.execute("DELETE FROM topics WHERE contest = ?", (contest,))
+        self.connection.executemany(
+            "INSERT INTO topics VALUES (?, ?, ?)", [(contest, name, i) for name, i in legend.items()]
+        )
+
+    def upsert_results(self, rows):
+        """
+        Insert or replace rows shaped like scrape_solution_pdf.RESULT_COLUMNS dicts
+        """
+        count = 0
+        for row in rows:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    row["Contest"].lower(), int(row["Year"]), int(row["Question"]), row.get("Correct Answer"),
+                    _number(row.get("Percentage Correct"), float), _number(row.get("Number of Contestants"), int),
+                    _number(row.get("Average Mark"), float), row.get("Source"),
+                ),
+            )
+            count += 1
+        return count
+
+    def apply_results(self, contest):
+        """
+        Set percentage_correct from the results table for every question that has a result
+        Returns the number of questions updated
+        """
+        cursor = self.connection.execute(
+            """
+            UPDATE questions SET percentage_correct = (
+                SELECT r.percentage_correct FROM results r
+                WHERE r.contest = questions.contest AND r.year = questions.year AND r.question = questions.number + 1
+            )
+            WHERE contest = ? AND EXISTS (
+                SELECT 1 FROM results r
+                WHERE r.contest = questions.contest AND r.year = questions.year AND r.question = questions.number + 1
+            )
+            """,
+            (contest,),
+        )
+        return cursor.rowcount
+
+    def import_questions_file(self, contest, path):
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        count = self.upsert_questions(contest, content["data"])
+        if content.get("legend"):
+            self.set_legend(contest, content["legend"])
+        self.set_sources(contest, content.get("sources", {}))
+        return count
+
+    def import_id_file(self, contest, path):
+        """
+        Load topic ids from a <contest>_id.json, including years that have no questions yet
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        for year, numbers in content["data"].items():
+            for number, topics in numbers.items():
+                self.set_question_topics(contest, int(year), int(number) - 1, topics)
+        self.set_legend(contest, content["legend"])
+
+    def import_results_csv(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            return self.upsert_results(csv.DictReader(f))
+
+    def topics(self, contest):
+        """
+        {(year, number): {"primaryTopics", "secondaryTopics"}} for every question with topic data,
+        plus "primaryMask" and "secondaryMask" where the imported topics had them
+        """
+        topics = {}
+        for row in self.connection.execute(
+            "SELECT year, number, kind, topic FROM question_topics WHERE contest = ? ORDER BY year, number, kind, position",
+            (contest,),
+        ):
+            entry = topics.setdefault((row["year"], row["number"]), {"primaryTopics": [], "secondaryTopics": []})
+            if row["kind"] != "none":
+                entry[row["kind"] + "Topics"].append(row["topic"])
+        for row in self.connection.execute(
+            "SELECT year, number, primary_mask, secondary_mask FROM question_topic_masks WHERE contest = ?", (contest,)
+        ):
+            entry = topics[(row["year"], row["number"])]
+            entry["primaryMask"] = row["primary_mask"]
+            entry["secondaryMask"] = row["secondary_mask"]
+        return topics
+
+    def legend(self, contest):
+        return {row["name"]: row["id"] for row in self.connection.execute(
+            "SELECT name, id FROM topics WHERE contest = ? ORDER BY id", (contest,)
+        )}
+
+    def question_count(self, contest):
+        return self.connection.execute("SELECT COUNT(*) FROM questions WHERE contest = ?", (contest,)).fetchone()[0]
+
+    def questions(self, contest, years=None, topic=None, min_correct=None, max_correct=None):
+        """
+        Question records for a contest in (year, number) order, optionally filtered by year,
+        topic id and percentage_correct range; each filter uses an index
+        """
+        query = "SELECT * FROM questions q WHERE q.contest = ?"
+        params = [contest]
+        if years:
+            query += f" AND q.year IN ({','.join('?' * len(years))})"
+            params.extend(years)
+        if topic is not None:
+            query += (" AND EXISTS (SELECT 1 FROM question_topics t WHERE t.contest = q.contest"
+                      " AND t.year = q.year AND t.number = q.number AND t.topic = ?)")
+            params.append(topic)
+        if min_correct is not None:
+            query += " AND q.percentage_correct >= ?"
+            params.append(min_correct)
+        if max_correct is not None:
+            query += " AND q.percentage_correct <= ?"
+            params.append(max_correct)
+        query += " ORDER BY q.year, q.number"
+
+        topics = self.topics(contest)
+        for row in self.connection.execute(query, params):
+            yield self._record(row, topics.get((row["year"], row["number"])))
+
+    def _record(self, row, topics):
+        source = {"year": row["year"], "number": row["number"]}
+        if row["hash"] is not None:
+            source["hash"] = row["hash"]
+        if row["source_extra"]:
+            source.update(json.loads(row["source_extra"]))
+        record = {
+            "question": row["question"],
+            "answers": None if row["answers"] is None else json.loads(row["answers"]),
+            "solutions": {"solution": row["solution"], "ans": row["ans"]},
+            "topics": topics,
+            "source": source,
+            "percentage_correct": row["percentage_correct"],
+        }
+        if row["extra"]:
+            record.update(json.loads(row["extra"]))
+        return record
+
+    def export_questions(self, contest, path, indent=None):
+        """
+        Write <contest>_questions.json and its .pack from the store
+        The records are queried once and held in memory, since the pack needs all of them for its
+        topic layout and index; the JSON is then written from them one record at a time rather
+        than encoded as one string
+        Without `indent`, an existing file keeps its indent and a new one gets scrape_question's 4
+        """
+        if indent is None:
+            indent = detect_indent(path, default=4)
+        sources = {str(row["year"]): row["hash"] for row in self.connection.execute(
+            "SELECT year, hash FROM sources WHERE contest = ? ORDER BY year", (contest,)
+        )}
+        members = {"legend": self.legend(contest)}
+        if sources:
+            members["sources"] = sources
+        records = list(self.questions(contest))
+        # The pack goes first, as in scrape_question.write_questions: it rejects records it cannot
+        # hold before the JSON is touched
+        write_pack(records, pack_path(path))
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            writer = JsonArrayWriter(f, indent=indent)
+            for record in records:
+                writer.write(record)
+            writer.close(members)
+        os.replace(tmp, path)
+        return writer.count
+
+    def export_id_file(self, contest, path, indent=None):
+        """
+        Write <contest>_id.json: {"data": {year: {1-based number: topics}}, "legend"}
+        Without `indent`, an existing file keeps its indent and a new one gets post_processing's 2
+        """
+        if indent is None:
+            indent = detect_indent(path, default=2)
+        data = {}
+        for (year, number), topics in sorted(self.topics(contest).items()):
+            data.setdefault(str(year), {})[str(number + 1)] = topics
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"data": data, "legend": self.legend(contest)}, f, indent=indent)
+
+    def export_results_csv(self, path, contest=None):
+        from scrape_solution_pdf import RESULT_COLUMNS
+
+        query = "SELECT * FROM results"
+        params = []
+        if contest:
+            query += " WHERE contest = ?"
+            params.append(contest)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_COLUMNS)
+            for row in self.connection.execute(query + " ORDER BY contest, year, question", params):
+                writer.writerow([
+                    row["contest"].capitalize(), row["year"], row["question"], row["correct_answer"],
+                    row["percentage_correct"], row["contestants"], row["average_mark"], row["source"],
+                ])
+
+
+def _number(value, kind):
+    if value in (None, ""):
+        return None
+    return kind(value)
+
+
+def import_contest_data(store, data_dir="contest_data"):
+    """
+    Load every <contest>_id.json and <contest>_questions.json under data_dir into the store
+    """
+    for contest in sorted(os.listdir(data_dir)):
+        directory = os.path.join(data_dir, contest)
+        if not os.path.isdir(directory):
+            continue
+        id_file = os.path.join(directory, f"{contest}_id.json")
+        questions_file = os.path.join(directory, f"{contest}_questions.json")
+        if os.path.exists(id_file):
+            store.import_id_file(contest, id_file)
+        if os.path.exists(questions_file):
+            print(f"Imported {store.import_questions_file(contest, questions_file)} {contest} questions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the SQLite corpus store and export files from it")
+    parser.add_argument("--db", default=CORPUS_DB)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    load = subcommands.add_parser("import", help="load contest_data JSON files and results CSVs")
+    load.add_argument("--data-dir", default="contest_data")
+    load.add_argument("--results", nargs="*", default=[], help="results CSVs from scrape_solution_pdf.py parse")
+    export = subcommands.add_parser("export", help="regenerate the JSON files the site reads")
+    export.add_argument("contests", nargs="+")
+    export.add_argument("--data-dir", default="contest_data")
+    export.add_argument("--indent", type=int, help="indent of the written JSON (default: keep each existing file's)")
+    export.add_argument("--apply-results", action="store_true", help="set percentage_correct from the results table first")
+    args = parser.parse_args()
+
+    with CorpusStore(args.db) as store:
+        if args.command == "import":
+            import_contest_data(store, args.data_dir)
+            for path in args.results:
+                print(f"Imported {store.import_results_csv(path)} results from {path}")
+        else:
+            for contest in args.contests:
+                if args.apply_results:
+                    print(f"Set percentage_correct on {store.apply_results(contest)} {contest} questions")
+                directory = os.path.join(args.data_dir, contest)
+                os.makedirs(directory, exist_ok=True)
+                store.export_id_file(contest, os.path.join(directory, f"{contest}_id.json"), args.indent)
+                if store.question_count(contest):
+                    count = store.export_questions(contest, os.path.join(directory, f"{contest}_questions.json"), args.indent)
+                    print(f"Exported {count} {contest} questions to {directory}")
+                else:
+                    print(f"Exported {contest} topic ids to {directory} (no questions stored)")
@@ -0,0 +1,184 @@
+import argparse
+import base64
+import html
+import json
+import os
+import re
+import zlib
+
+import brotli
+import numpy as np
+
+from instrumentation import metrics
+from json_stream import detect_indent
+
+TAG = re.compile(r"<[^>]*>")
+SPACE = re.compile(r"\s+")
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+NUM_PERM = 128
+BANDS = 16
+THRESHOLD = 0.8
+
+
+def question_text(record):
+    """
+    Normalised text of a question and its choices: tags (and inline images) removed,
+    entities decoded, lower case, single spaces
+    """
+    question = brotli.decompress(base64.b64decode(record["question"])).decode("utf-8")
+    parts = [question] + (record.get("answers") or [])
+    text = html.unescape(TAG.sub(" ", " ".join(parts)))
+    return SPACE.sub(" ", text).strip().lower()
+
+
+def shingles(text, size=3):
+    """
+    crc32 of every `size`-word window of the text, as a uint64 array
+    """
+    words = text.split(" ")
+    windows = [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+    return np.unique(np.array([zlib.crc32(w.encode("utf-8")) for w in windows], dtype=np.uint64))
+
+
+class MinHasher:
+    """
+    MinHash signatures from `num_perm` random hash functions (a * x + b) mod p
+    a < 2^31 and x < 2^32 keep a * x + b inside uint64
+    """
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes):
+        values = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % np.uint64(MERSENNE_PRIME)
+        return (values & np.uint64(MAX_HASH)).min(axis=1).astype(np.uint32)
+
+
+def candidate_pairs(signatures, bands=BANDS):
+    """
+    Pairs of rows whose signatures agree on every row of at least one band
+    Each band is bucketed with a dict, so the cost grows with the number of questions,
+    not the number of pairs
+    """
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(len(chunk)):
+            buckets.setdefault(chunk[i].tobytes(), []).append(i)
+        for members in buckets.values():
+            for j, first in enumerate(members):
+                for second in members[j + 1:]:
+                    pairs.add((first, second))
+    return pairs
+
+
+def group_duplicates(signatures, bands=BANDS, threshold=THRESHOLD):
+    """
+    Group near-duplicate rows: LSH candidates whose estimated Jaccard similarity (the share of
+    equal signature values) is at least `threshold`, joined transitively
+    Returns a list of root indices, one per row
+    """
+    parent = list(range(len(signatures)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    pairs = candidate_pairs(signatures, bands)
+    metrics.count("duplicate_candidates", len(pairs))
+    for first, second in pairs:
+        if np.mean(signatures[first] == signatures[second]) >= threshold:
+            a, b = find(first), find(second)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+    return [find(i) for i in range(len(signatures))]
+
+
+def load_corpus(files):
+    """
+    [(contest, record)] for every question of the given _questions.json files
+    """
+    corpus = []
+    for path in files:
+        contest = os.path.basename(path)[:-len("_questions.json")]
+        with open(path, "r", encoding="utf-8") as f:
+            corpus.extend((contest, record) for record in json.load(f)["data"])
+    return corpus
+
+
+def question_key(contest, record):
+    return f"{contest}/{record['source']['year']}/{record['source']['number'] + 1}"
+
+
+def find_duplicates(files, num_perm=NUM_PERM, bands=BANDS, threshold=THRESHOLD):
+    """
+    Near-duplicate questions across the given _questions.json files
+    Returns {"questions": {key: group id}, "groups": {group id: [keys]}} where keys look like
+    "gauss7/2015/3" (question numbers are 1-based) and only questions with a duplicate appear
+    A group id is the key of its first member
+    """
+    corpus = load_corpus(files)
+    hasher = MinHasher(num_perm)
+    with metrics.stage("minhash"):
+        signatures = np.array([hasher.signature(shingles(question_text(record))) for _, record in corpus])
+    with metrics.stage("lsh"):
+        roots = group_duplicates(signatures, bands, threshold)
+
+    keys = [question_key(contest, record) for contest, record in corpus]
+    members = {}
+    for i, root in enumerate(roots):
+        members.setdefault(root, []).append(keys[i])
+    groups = {keys[root]: group for root, group in members.items() if len(group) > 1}
+    metrics.count("duplicate_groups", len(groups))
+    return {
+        "questions": {key: group_id for group_id, group in groups.items() for key in group},
+        "groups": groups,
+    }
+
+
+def annotate(files, duplicates):
+    """
+    Set source.duplicate_group on every question that has a near-duplicate, so the site can
+    avoid serving the same problem twice under different contests
+    Each file keeps its own indent, so the rewrite only touches the annotated records
+    """
+    for path in files:
+        contest = os.path.basename(path)[:-len("_questions.json")]
+        indent = detect_indent(path)
+        with open(path, "r", encoding="utf-8") as f:
+            content = json.load(f)
+        for record in content["data"]:
+            group = duplicates["questions"].get(question_key(contest, record))
+            if group is None:
+                record["source"].pop("duplicate_group", None)
+            else:
+                record["source"]["duplicate_group"] = group
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(content, f, indent=indent)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate questions across contests with MinHash/LSH")
+    parser.add_argument("files", nargs="+", help="_questions.json files")
+    parser.add_argument("--output", default="contest_data/duplicates.json")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="estimated Jaccard similarity of word 3-grams")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--annotate", action="store_true", help="also write source.duplicate_group into the files")
+    args = parser.parse_args()
+
+    duplicates = find_duplicates(args.files, args.num_perm, args.bands, args.threshold)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(duplicates, f, indent=2)
+    print(f"Found {len(duplicates['groups'])} groups covering {len(duplicates['questions'])} questions, saved to {args.output}")
+    if args.annotate:
+        annotate(args.files, duplicates)
+        print(f"Annotated {len(args.files)} files")
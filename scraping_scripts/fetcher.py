@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from instrumentation import metrics
+
+HEADERS = {"Accept": "application/vnd.citationstyles.csl+json"}
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host by at least `interval` seconds
+    Requests to different hosts do not wait on each other
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    """
+    Fetches pages over a pooled session with retry/backoff and per-host rate limiting
+    submit() and fetch_all() run the requests on one bounded thread pool, started on first use
+    """
+
+    def __init__(self, workers=8, interval=0.2, retries=4, backoff=0.5, timeout=30, cache=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = HostRateLimiter(interval)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, url, headers=None):
+        self.limiter.wait(url)
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    def get(self, url):
+        """
+        Fetch a single page, through the cache if one is set, and return its text decoded as utf-8
+        Raises requests.HTTPError on a non-2xx response once retries are exhausted
+        """
+        return self.get_bytes(url).decode("utf-8")
+
+    def get_bytes(self, url):
+        """
+        Like get() but returns the raw body, e.g. for images
+        """
+        if self.cache is not None:
+            return self.cache.get(url, self.request)
+        response = self.request(url)
+        response.raise_for_status()
+        metrics.count("pages_fetched")
+        return response.content
+
+    def submit(self, url):
+        """
+        Start fetching a page on the thread pool; returns a Future of get(url)
+        """
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self.pool.submit(self.get, url)
+
+    def fetch_all(self, urls):
+        """
+        Fetch every unique url concurrently
+        Returns (pages, errors): dicts of url -> text and url -> exception
+        """
+        return collect({url: self.submit(url) for url in dict.fromkeys(urls)})
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        self.session.close()
+
+
+def collect(futures):
+    """
+    Wait for {url: Future} and split the outcomes into (pages, errors)
+    """
+    pages = {}
+    errors = {}
+    for url, future in futures.items():
+        try:
+            pages[url] = future.result()
+        except Exception as e:
+            errors[url] = e
+    return pages, errors
+
+
+class BatchPrefetcher:
+    """
+    Fetches a fixed sequence of url batches, always keeping the next batch in flight
+
+    get(i) returns (pages, errors) for batch i, waiting only for what is still downloading, and
+    starts batch i + 1 on the fetcher's pool so it downloads while the caller works on batch i
+    A url in several batches (e.g. a solution page two contests share) is fetched once and held
+    until the last batch that lists it has been returned
+    Batches must be taken in order
+    """
+
+    def __init__(self, fetcher, batches):
+        self.fetcher = fetcher
+        self.batches = [list(dict.fromkeys(batch)) for batch in batches]
+        self.remaining = Counter(url for batch in self.batches for url in batch)
+        self.futures = {}
+        self.submitted = 0
+
+    def _submit_through(self, last):
+        while self.submitted <= min(last, len(self.batches) - 1):
+            for url in self.batches[self.submitted]:
+                if url not in self.futures:
+                    self.futures[url] = self.fetcher.submit(url)
+            self.submitted += 1
+
+    def get(self, i):
+        self._submit_through(i + 1)
+        pages, errors = collect({url: self.futures[url] for url in self.batches[i]})
+        for url in self.batches[i]:
+            self.remaining[url] -= 1
+            if not self.remaining[url]:
+                del self.futures[url]
+        return pages, errors
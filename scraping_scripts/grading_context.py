@@ -0,0 +1,163 @@
+import argparse
+import base64
+import os
+import re
+
+import brotli
+import lxml.html
+
+from instrumentation import metrics
+from post_processing import enrich_file
+
+# Tags that start a new line in the plain-text form
+BLOCK_TAGS = {"p", "div", "br", "ul", "ol", "table", "center", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6"}
+SKIP_TAGS = {"script", "style"}
+LETTERS = "ABCDE"
+# MathJax delimiters become $...$ and $$...$$; a "\\[" line break inside TeX is left alone
+DELIMITERS = (
+    (re.compile(r"(?<!\\)\\\(|(?<!\\)\\\)"), "$"),
+    (re.compile(r"(?<!\\)\\\[|(?<!\\)\\\]"), "$$"),
+)
+TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|\S")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for a SentencePiece-style tokenizer such as Gemini's: a word costs
+    one token per four letters, a number one per three digits and any other symbol one
+    """
+    return sum((len(piece) + 3) // 4 if piece[0].isalpha() else 1 for piece in TOKEN_PIECES.findall(text))
+
+
+def _walk(element, parts):
+    tag = element.tag if isinstance(element.tag, str) else None
+    if tag in SKIP_TAGS:
+        parts.append(element.tail or "")
+        return
+    if tag == "tr":
+        # One line per row, cells separated by " | "
+        cells = []
+        for cell in element:
+            cell_parts = [cell.text or ""]
+            for child in cell:
+                _walk(child, cell_parts)
+            cells.append(" ".join("".join(cell_parts).split()))
+        parts.append("\n" + " | ".join(cells) + "\n")
+        parts.append(element.tail or "")
+        return
+    if tag == "img":
+        alt = (element.get("alt") or "").strip()
+        parts.append(f"[image: {alt}]" if alt else "[image]")
+    elif tag in BLOCK_TAGS:
+        parts.append("\n")
+    elif tag == "li":
+        parts.append("\n- ")
+    if tag is not None:
+        parts.append(element.text or "")
+        for child in element:
+            _walk(child, parts)
+        if tag in BLOCK_TAGS:
+            parts.append("\n")
+    parts.append(element.tail or "")
+
+
+def html_to_text(fragment):
+    """
+    Plain text of a question or solution HTML fragment for a grading prompt
+    Markup, attributes and images are dropped (an image leaves "[image]" or its alt text),
+    list items and table rows keep one line each and math stays as TeX between $ signs
+    """
+    if not fragment or not fragment.strip():
+        return ""
+    parts = []
+    _walk(lxml.html.fragment_fromstring(fragment, create_parent="div"), parts)
+    text = "".join(parts)
+    for pattern, replacement in DELIMITERS:
+        text = pattern.sub(replacement, text)
+    lines = (" ".join(line.split()) for line in text.split("\n"))
+    return "\n".join(line for line in lines if line and line != "-")
+
+
+def decode_html(payload):
+    return brotli.decompress(base64.b64decode(payload)).decode("utf-8")
+
+
+def grading_context(question_html, solution_html, answers=None, ans=None, tokenizer=estimate_tokens):
+    """
+    Condensed question and solution text for grading, with its size
+    Returns {"question": text, "solution": text, "chars": n, "tokens": n}; chars and tokens
+    cover both texts, tokens as counted by `tokenizer`
+    """
+    question = html_to_text(question_html)
+    if answers:
+        question += "\n" + "\n".join(f"({letter}) {html_to_text(a)}" for letter, a in zip(LETTERS, answers))
+    solution = html_to_text(solution_html)
+    if ans:
+        solution += f"\nAnswer: ({ans})"
+    tokens = tokenizer(question) + tokenizer(solution)
+    metrics.count("grading_tokens", tokens)
+    return {"question": question, "solution": solution, "chars": len(question) + len(solution), "tokens": tokens}
+
+
+def add_grading(record, compressed=True, tokenizer=estimate_tokens):
+    """
+    Store the grading context on a question record, or on every sub-question of a
+    sequence record (as in fryer_questions.json), where it includes the shared base
+    `compressed` says whether the HTML fields are still base64 brotli (answers never are)
+    """
+    html = decode_html if compressed else (lambda fragment: fragment)
+    if "subQuestions" in record:
+        base = html(record["base"])
+        for sub in record["subQuestions"]:
+            sub["grading"] = grading_context(base + html(sub["html"]), html(sub["solution"]), tokenizer=tokenizer)
+    else:
+        record["grading"] = grading_context(
+            html(record["question"]), html(record["solutions"]["solution"]),
+            record["answers"], record["solutions"]["ans"], tokenizer,
+        )
+    return record
+
+
+def grading_costs(record):
+    """
+    [(label, tokens)] for a record that has its grading context
+    """
+    label = f"{record['source']['year']} Q{record['source']['number'] + 1}"
+    if "subQuestions" in record:
+        return [(f"{label}({chr(ord('a') + i)})", sub["grading"]["tokens"]) for i, sub in enumerate(record["subQuestions"])]
+    return [(label, record["grading"]["tokens"])]
+
+
+def add_grading_file(questions_file, output=None, indent=4, tokenizer=estimate_tokens):
+    """
+    Add the grading context to every record of a _questions.json file in one streaming pass
+    Returns [(label, tokens)] for every gradable item
+    """
+    costs = []
+
+    def enrich(record):
+        add_grading(record, tokenizer=tokenizer)
+        costs.extend(grading_costs(record))
+        return record
+
+    enrich_file(questions_file, output or questions_file, [enrich], indent)
+    return costs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store condensed plain-text grading context on question files")
+    parser.add_argument("files", nargs="+", help="_questions.json files, including sequence files like fryer_questions.json")
+    parser.add_argument("--indent", type=int, default=4, help="indent of the rewritten files")
+    parser.add_argument("--top", type=int, default=10, help="list the most expensive questions to grade")
+    args = parser.parse_args()
+
+    for questions_file in args.files:
+        costs = add_grading_file(questions_file, indent=args.indent)
+        if not costs:
+            continue
+        tokens = sorted(cost for _, cost in costs)
+        contest = os.path.basename(questions_file).split("_")[0]
+        print(f"{questions_file}: {len(costs)} items, {sum(tokens)} tokens, "
+              f"median {tokens[len(tokens) // 2]}, max {tokens[-1]}")
+        for label, cost in sorted(costs, key=lambda c: c[1], reverse=True)[:args.top]:
+            print(f"  {contest} {label}  {cost} tokens")
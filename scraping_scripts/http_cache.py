@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from instrumentation import metrics
+
+MODES = ("cache", "offline", "revalidate")
+
+
+class OfflineCacheMiss(Exception):
+    pass
+
+
+class HttpCache:
+    """
+    Content-addressed on-disk cache of HTTP responses
+
+    Bodies are stored once under objects/<sha256 of body>, and each url has an entry
+    under urls/<sha256 of url>.json pointing at its body along with the ETag and
+    Last-Modified headers it was served with
+
+    Modes:
+      - cache: serve from disk when present, otherwise fetch and store
+      - offline: only serve from disk, raise OfflineCacheMiss on a miss
+      - revalidate: send If-None-Match/If-Modified-Since and reuse the body on a 304
+    """
+
+    def __init__(self, directory=".http_cache", mode="cache"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode {mode}, expected one of {MODES}")
+        self.directory = directory
+        self.mode = mode
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "urls"), exist_ok=True)
+
+    def _entry_path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "urls", key + ".json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest)
+
+    def _write(self, path, data):
+        # Write to a temporary file first so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def lookup(self, url):
+        """
+        Returns (entry, body) for a cached url, or (None, None)
+        """
+        path = self._entry_path(url)
+        if not os.path.exists(path):
+            return None, None
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        object_path = self._object_path(entry["body"])
+        if not os.path.exists(object_path):
+            return None, None
+        with open(object_path, "rb") as f:
+            return entry, f.read()
+
+    def store(self, url, body, headers):
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._write(object_path, body)
+        entry = {
+            "url": url,
+            "body": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched": time.time(),
+        }
+        self._write(self._entry_path(url), json.dumps(entry).encode("utf-8"))
+
+    def get(self, url, fetch):
+        """
+        Return the body of `url` as bytes, going through the cache
+        `fetch(url, headers)` performs the network request and returns a requests.Response;
+        it is only called when the mode and cache state require it
+        """
+        entry, body = self.lookup(url)
+        if self.mode == "offline":
+            if body is None:
+                raise OfflineCacheMiss(f"{url} is not in the cache")
+            metrics.count("pages_cached")
+            return body
+        if body is not None and self.mode == "cache":
+            metrics.count("pages_cached")
+            return body
+
+        headers = {}
+        if body is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = fetch(url, headers)
+        if response.status_code == 304 and body is not None:
+            metrics.count("pages_not_modified")
+            return body
+        response.raise_for_status()
+        metrics.count("pages_fetched")
+        self.store(url, response.content, response.headers)
+        return response.content
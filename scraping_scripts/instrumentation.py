@@ -0,0 +1,113 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def cpu_time():
+    """
+    CPU seconds of this process plus its reaped children (e.g. finished pool workers)
+    """
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+class Metrics:
+    """
+    Per-stage wall/CPU time and named counters for one build run
+
+    Stages are named like "parse" or "parse/pascal/2024"; the report totals every stage under
+    its first path component as well, so one run answers both "which stage is slow" and
+    "which contest/year is slow in it". CPU time is this process's time (all of its threads) plus
+    that of child processes reaped during the stage, so a process pool shut down inside the
+    stage (as iter_compress and the PDF parsers do) is counted; children still running when the
+    stage ends, or on platforms where os.times() has no child times, are missed
+    Stages listed in `profile` (by name or path prefix, or "all") are run under cProfile and
+    their stats dumped to <profile_dir>/<stage>.prof, readable with `python -m pstats`
+    """
+
+    def __init__(self, profile=(), profile_dir="profiles"):
+        self.lock = threading.Lock()
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.profiling = False
+
+    def configure(self, profile=(), profile_dir="profiles"):
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+
+    def _should_profile(self, name):
+        if self.profiling:
+            # cProfile cannot nest; the outer stage's profile already covers this one
+            return False
+        return "all" in self.profile or any(name == p or name.startswith(p + "/") for p in self.profile)
+
+    @contextmanager
+    def stage(self, name):
+        profiler = None
+        if self._should_profile(name):
+            profiler = cProfile.Profile()
+            self.profiling = True
+            profiler.enable()
+        wall = time.perf_counter()
+        cpu = cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = cpu_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, name.replace("/", "_") + ".prof"))
+            with self.lock:
+                totals = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+                totals["calls"] += 1
+                totals["wall"] += wall
+                totals["cpu"] += cpu
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        """
+        {"stages": {name: {calls, wall, cpu}}, "totals": {top-level stage: {wall, cpu}}, "counters": {...}}
+        Totals only add up stages without a nested parent, so "parse" and "parse/pascal/2024"
+        recorded together are not counted twice
+        """
+        totals = {}
+        for name, stage in self.stages.items():
+            top = name.split("/")[0]
+            if name != top and top in self.stages:
+                continue
+            total = totals.setdefault(top, {"wall": 0.0, "cpu": 0.0})
+            total["wall"] += stage["wall"]
+            total["cpu"] += stage["cpu"]
+        return {"stages": self.stages, "totals": totals, "counters": self.counters}
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary(self):
+        """
+        Print the slowest stages and every counter
+        """
+        report = self.report()
+        for name, total in sorted(report["totals"].items(), key=lambda item: item[1]["wall"], reverse=True):
+            print(f"{name:10} {total['wall']:8.2f}s wall {total['cpu']:8.2f}s cpu")
+        for name, value in sorted(report["counters"].items()):
+            print(f"  {name}: {value}")
+
+
+# Shared by the scripts of one run; scripts call metrics.configure() from their CLI flags
+metrics = Metrics()
@@ -0,0 +1,64 @@
+import json
+import os
+
+
+def journal_path(output_file):
+    """
+    contest_data/pascal/pascal_questions.json -> contest_data/pascal/pascal_questions.journal.jsonl
+    """
+    return os.path.splitext(output_file)[0] + ".journal.jsonl"
+
+
+class Journal:
+    """
+    Append-only JSON Lines log of finished question records for one _questions.json file
+    Every record is flushed as soon as it is written, so a run that crashes or is interrupted
+    keeps everything it finished; the next run picks the records up from read_journal()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def append(self, record):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        """
+        Delete the journal once its records are in the compacted file
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_journal(path):
+    """
+    Yield the records of a journal in the order they were written
+    A final line cut short by a crash is ignored
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                break
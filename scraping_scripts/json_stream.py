@@ -0,0 +1,154 @@
+import json
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",:]}"
+
+
+def detect_indent(path, default=4):
+    """
+    Indent of an existing JSON file written by json.dump: the leading spaces of its second line
+    None for a single-line file, `default` if the file does not exist
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            f.readline()
+            line = f.readline()
+    except FileNotFoundError:
+        return default
+    if not line:
+        return None
+    return len(line) - len(line.lstrip(" "))
+
+
+class JsonArrayReader:
+    """
+    Reads a JSON object like {"data": [...], "legend": {...}} from a file without loading it whole
+
+    Iterating yields the elements of the `key` array one at a time; the other top-level members
+    are collected in `members` as they are passed (those after the array once iteration ends)
+    Only the current element and one read chunk are held in memory
+    """
+
+    def __init__(self, f, key="data", chunk_size=CHUNK_SIZE):
+        self.file = f
+        self.key = key
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.members = {}
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been consumed so the buffer stays about one chunk long
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """
+        Next non-whitespace character, without consuming it
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def _expect(self, characters):
+        character = self._peek()
+        if character not in characters:
+            raise ValueError(f"Expected one of {characters!r} at {self.pos}, found {character!r}")
+        self.pos += 1
+        return character
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value cut off at the end of the buffer can still decode (a number like "2" of
+                # "2.5"), so only accept it once the character after it is a delimiter
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if name == self.key:
+                self._expect("[")
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.members[name] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+class JsonArrayWriter:
+    """
+    Writes {key: [...], other members...} one array element at a time
+    The output is byte-for-byte what json.dump(document, f, indent=indent) writes for the
+    same document with `key` first
+    """
+
+    def __init__(self, f, key="data", indent=2):
+        self.file = f
+        self.key = key
+        self.indent = indent
+        self.count = 0
+        if indent is None:
+            self.file.write("{" + json.dumps(key) + ": [")
+        else:
+            self.file.write("{\n" + " " * indent + json.dumps(key) + ": [")
+
+    def _dumps(self, value, depth):
+        text = json.dumps(value, indent=self.indent)
+        if self.indent is None:
+            return text
+        return text.replace("\n", "\n" + " " * (self.indent * depth))
+
+    def write(self, element):
+        if self.indent is None:
+            self.file.write((", " if self.count else "") + self._dumps(element, 0))
+        else:
+            self.file.write(("," if self.count else "") + "\n" + " " * (self.indent * 2) + self._dumps(element, 2))
+        self.count += 1
+
+    def close(self, members=None):
+        """
+        End the array and write the remaining top-level members
+        """
+        members = members or {}
+        if self.indent is None:
+            self.file.write("]")
+            for name, value in members.items():
+                self.file.write(", " + json.dumps(name) + ": " + self._dumps(value, 0))
+            self.file.write("}")
+            return
+        self.file.write(("\n" + " " * self.indent + "]") if self.count else "]")
+        for name, value in members.items():
+            self.file.write(",\n" + " " * self.indent + json.dumps(name) + ": " + self._dumps(value, 1))
+        self.file.write("\n}")
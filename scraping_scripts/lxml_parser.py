@@ -0,0 +1,229 @@
+import copy
+import re
+
+import lxml.html
+from lxml import etree
+
+from instrumentation import metrics
+
+# Also used by the BeautifulSoup parser in scrape_question
+ANSWER_PATTERN = re.compile(r"(?:<[^>]+>)*Answer(?::)?(?:</[^>]+>)*(?::\s*)?(?:<[^>]+>)*\s*(?:\((?P<letter>[A-Za-z]+)\)|(?:\\\()*(?P<digits>\d+)(?:\\\))*)")
+
+# Elements BeautifulSoup writes as <br/> rather than <br>
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+ASCII_SPACES = " \n\t\x0c\r"
+PRESERVE_WHITESPACE = {"pre", "textarea"}
+VOID_TAG = re.compile(r"<(%s)\b((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>" % "|".join(VOID_ELEMENTS))
+
+
+def to_html(element):
+    """
+    Serialize an element (without its tail) the way BeautifulSoup's str() does,
+    so both engines produce the same stored HTML and content hashes
+    """
+    html = lxml.html.tostring(element, encoding="unicode", with_tail=False)
+    return VOID_TAG.sub(lambda m: f"<{m.group(1)}{m.group(2).rstrip('/')}/>", html)
+
+
+def inner_html(element):
+    """
+    Serialized children of an element, like BeautifulSoup's decode_contents()
+    """
+    parts = [escape_text(element.text)] if element.text else []
+    for child in element:
+        parts.append(to_html(child))
+        if child.tail:
+            parts.append(escape_text(child.tail))
+    return "".join(parts)
+
+
+def escape_text(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def collapse_whitespace(root):
+    """
+    BeautifulSoup replaces whitespace-only strings with a single newline (or a space when there
+    is no newline in them) outside <pre>/<textarea>; do the same so the serialized HTML matches
+    """
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        if element.text and not element.text.strip(ASCII_SPACES) and element.tag not in PRESERVE_WHITESPACE:
+            element.text = "\n" if "\n" in element.text else " "
+        parent = element.getparent()
+        if element.tail and not element.tail.strip(ASCII_SPACES) and (parent is None or parent.tag not in PRESERVE_WHITESPACE):
+            element.tail = "\n" if "\n" in element.tail else " "
+
+
+def drop(element):
+    """
+    Remove an element but keep the text that follows it, like BeautifulSoup's decompose()
+    """
+    parent = element.getparent()
+    if element.tail:
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def body_of(html):
+    document = lxml.html.document_fromstring(html)
+    body = document.find("body")
+    if body is not None:
+        collapse_whitespace(body)
+    return document, body
+
+
+def find_questions(document, body):
+    """
+    The <li> of every question on a contest page; see scrape_question.find_questions
+    """
+    if body is None:
+        return []
+    ol_elements = body.xpath(".//ol[not(@class)]")
+
+    # Check for hide/show drawing button beside ordered list of description
+    target_ol = None
+    button = document.find(".//button")
+    if button is not None:
+        div = button.getnext()
+        while div is not None and div.tag != "div":
+            div = div.getnext()
+        target_ol = div.find(".//ol") if div is not None else None
+
+    questions = []
+    for ol in ol_elements[1:]:
+        # On 2020 contest answers had type=a
+        if ol.get("type") == "a" or ol is target_ol:
+            continue
+        questions.extend(child for child in ol if child.tag == "li")
+    return questions
+
+
+def parse_questions(html, year):
+    """
+    Same output as scrape_question.parse_questions, parsing the page once with lxml
+    """
+    document, body = body_of(html)
+    questions = find_questions(document, body)
+
+    question_data = []
+    for i, question in enumerate(questions[:25]):
+        index = 0
+        is_weird = False
+        button = question.find(".//button")
+        answers = question.findall(".//ol")
+
+        if len(answers) < 1 and year < 2022:
+            # Pre-2022 pages put the choices after the question <li> instead of inside it,
+            # so gather the following siblings up to the next question into a detached body
+            is_weird = True
+            metrics.count("is_weird_fallback")
+            container = etree.Element("body")
+            container.append(copy.deepcopy(question))
+            sibling = question.getnext()
+            while sibling is not None and sibling.tag != "li":
+                container.append(copy.deepcopy(sibling))
+                sibling = sibling.getnext()
+            question = container
+            answers = question.findall(".//ol")
+
+        if button is not None and len(answers) > 1:
+            index += 1
+        answer_ol = answers[index] if answers else None
+
+        choices = None
+        if answer_ol is not None:
+            choices = []
+            for answer in answer_ol.iter("li"):
+                text = answer.xpath("string()")
+                choices.append(text if text.strip() != "" else inner_html(answer))
+            drop(answer_ol)
+
+        question_html = inner_html(question) if is_weird else to_html(question)
+        if question_html == "":
+            raise ValueError("Empty question at " + str(i))
+        question_data.append((question_html, choices))
+    return question_data
+
+
+def parse_solutions(html, index):
+    """
+    Same output as scrape_question.parse_solutions, parsing the page once with lxml
+    """
+    document, body = body_of(html)
+    solutions = []
+    if body is not None:
+        ol = [child for child in body if child.tag == "ol"]
+        solutions = [child for child in ol[index] if child.tag == "li"]
+
+    solution_data = []
+    for i, solution in enumerate(solutions[:25]):
+        ans = None
+        paragraphs = solution.findall(".//p")
+        if paragraphs:
+            answer = paragraphs[-1]
+            # The last solution sometimes ends with a note after the answer
+            if i == 24 and "Answer" not in to_html(answer):
+                answer = paragraphs[-2]
+                metrics.count("q25_answer_fallback")
+            ans = to_html(answer)
+            drop(answer)
+
+        solution_html = to_html(solution)
+        if solution_html == "":
+            raise ValueError("Empty solution at " + str(i))
+
+        match = ANSWER_PATTERN.search(ans)
+        solution_data.append((solution_html, match.group("letter") or match.group("digits")))
+    return solution_data
+
+
+def benchmark(fixture_dir, repeat=5):
+    """
+    Time this engine against the BeautifulSoup parser in scrape_question on saved contest and
+    solution pages, and check both produce the same output
+    """
+    import glob
+    import os
+    import time
+    import warnings
+
+    import scrape_question
+
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    engines = {
+        "bs4": (scrape_question.parse_questions, scrape_question.parse_solutions),
+        "lxml": (parse_questions, parse_solutions),
+    }
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*", "*Contest.html"))):
+        name = os.path.basename(path)
+        year = int(name[:4])
+        contest = name[4:-len("Contest.html")].lower()
+        solution_path = path.replace(scrape_question.CONTESTS[contest]["contest"], scrape_question.CONTESTS[contest]["solution"])
+        with open(path, encoding="utf-8") as f:
+            contest_html = f.read()
+        with open(solution_path, encoding="utf-8") as f:
+            solution_html = f.read()
+        index = scrape_question.CONTESTS[contest]["solution_index"]
+
+        outputs = {}
+        timings = {}
+        for engine, (questions, solutions) in engines.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                outputs[engine] = (questions(contest_html, year), solutions(solution_html, index))
+            timings[engine] = (time.perf_counter() - start) / repeat
+        same = "identical" if outputs["bs4"] == outputs["lxml"] else "DIFFERENT"
+        print(f"{name}: bs4 {timings['bs4'] * 1000:.1f}ms, lxml {timings['lxml'] * 1000:.1f}ms "
+              f"({timings['bs4'] / timings['lxml']:.1f}x), output {same}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else "test/fixtures/html")
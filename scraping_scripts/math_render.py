@@ -0,0 +1,112 @@
+import html
+import json
+import os
+import re
+
+from instrumentation import metrics
+
+# Same spans and clean-up as addMathInline/processAnswer in site/src/lib/index.ts
+INLINE_MATH = re.compile(r'<span class="math inline">(.*?)</span>', re.S)
+DISPLAY_MATH = re.compile(r'<span class="math display">(.*?)</span>', re.S)
+MATH_CACHE = ".mathml_cache.json"
+
+
+def strip_delimiters(tex, opening, closing):
+    return tex.replace(opening, "").replace(closing, "")
+
+
+class MathRenderer:
+    """
+    Converts the TeX in stored question HTML to static MathML at build time, so the site can
+    show it without typesetting on every page view
+
+    Conversions are cached by TeX string in `cache_path` (the same expressions recur across
+    years and contests). Expressions that fail to convert are left as TeX for the site to
+    render and listed in `failures`
+    Needs the latex2mathml package
+    """
+
+    def __init__(self, cache_path=MATH_CACHE):
+        try:
+            from latex2mathml.converter import convert
+        except ImportError:
+            raise ImportError("MathML pre-rendering needs latex2mathml: pip install latex2mathml")
+        self.convert_tex = convert
+        self.cache_path = cache_path
+        self.cache = {"inline": {}, "block": {}}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+        self.failures = {}
+
+    def convert(self, tex, display=False):
+        """
+        MathML for one TeX expression (without delimiters), or None if it cannot be converted
+        """
+        mode = "block" if display else "inline"
+        cached = self.cache[mode].get(tex)
+        if cached is not None:
+            metrics.count("math_cache_hits")
+            return cached
+        try:
+            mathml = self.convert_tex(tex, display=mode)
+        except Exception as e:
+            failure = self.failures.setdefault(tex, {"display": display, "error": f"{type(e).__name__}: {e}", "count": 0})
+            failure["count"] += 1
+            metrics.count("math_failures")
+            return None
+        metrics.count("math_converted")
+        self.cache[mode][tex] = mathml
+        return mathml
+
+    def render_html(self, fragment):
+        """
+        Replace the inline and display math spans of an HTML fragment with MathML
+        """
+        # Spans holding images are left for the site, which does not typeset them either
+        def inline(match):
+            if "<img" in match.group(1):
+                return match.group(0)
+            tex = strip_delimiters(html.unescape(match.group(1)).replace("\\mbox", ""), "\\(", "\\)")
+            return self.convert(tex.strip()) or match.group(0)
+
+        def display(match):
+            if "<img" in match.group(1):
+                return match.group(0)
+            tex = strip_delimiters(html.unescape(match.group(1)).replace("\\mbox", ""), "\\[", "\\]")
+            return self.convert(tex.strip(), display=True) or match.group(0)
+
+        fragment = INLINE_MATH.sub(inline, fragment)
+        return DISPLAY_MATH.sub(display, fragment)
+
+    def render_answer(self, answer):
+        """
+        An answer choice is plain text holding TeX, e.g. "\\(16\\)", unless it is an image
+        """
+        if "img" in answer:
+            return answer
+        tex = strip_delimiters(answer.replace("\\mbox", "\\text"), "\\(", "\\)")
+        return self.convert(tex.strip()) or answer
+
+    def render_record(self, record):
+        """
+        Pre-render a question record in place, before its HTML is compressed
+        """
+        record["question"] = self.render_html(record["question"])
+        record["solutions"]["solution"] = self.render_html(record["solutions"]["solution"])
+        if record["answers"]:
+            record["answers"] = [self.render_answer(answer) for answer in record["answers"]]
+        return record
+
+    def save(self, failures_path=None):
+        """
+        Write the conversion cache, and the expressions that failed to `failures_path`
+        """
+        if self.cache_path:
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(tmp, self.cache_path)
+        if failures_path and self.failures:
+            with open(failures_path, "w", encoding="utf-8") as f:
+                json.dump(self.failures, f, indent=2)
@@ -0,0 +1,180 @@
+import argparse
+import base64
+import json
+import re
+import time
+import zlib
+
+import brotli
+
+# Codec specs look like "brotli:11", "zstd:19" or "zstd-dict:19"; the number is the level
+DEFAULT_CODEC = "brotli:11"
+DICTIONARY_SIZE = 64 * 1024
+DATA_URI = re.compile(rb'src="data:[^"]*"')
+
+
+class BrotliCodec:
+    """
+    Independent brotli per payload; what the site decodes today
+    """
+    name = "brotli"
+
+    def __init__(self, level=11, dictionary=None):
+        self.level = level
+        self.dictionary = None
+
+    def train(self, samples):
+        pass
+
+    def encode(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def decode(self, data):
+        return brotli.decompress(data)
+
+
+class ZlibCodec:
+    name = "zlib"
+
+    def __init__(self, level=9, dictionary=None):
+        self.level = level
+        self.dictionary = None
+
+    def train(self, samples):
+        pass
+
+    def encode(self, data):
+        return zlib.compress(data, self.level)
+
+    def decode(self, data):
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    """
+    zstd per payload; with `trained` set, a dictionary trained on the corpus is shared by every
+    payload, so the markup all fragments have in common is stored once in the dictionary
+    """
+    name = "zstd"
+    trained = False
+
+    def __init__(self, level=19, dictionary=None):
+        import zstandard
+
+        self.zstandard = zstandard
+        self.level = level
+        self.dictionary = dictionary
+        self._setup()
+
+    def _setup(self):
+        dictionary = self.zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+        self.compressor = self.zstandard.ZstdCompressor(level=self.level, dict_data=dictionary, write_content_size=True)
+        self.decompressor = self.zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def train(self, samples, size=DICTIONARY_SIZE):
+        if not self.trained:
+            return
+        self.dictionary = self.zstandard.train_dictionary(size, list(samples), level=self.level).as_bytes()
+        self._setup()
+
+    def encode(self, data):
+        return self.compressor.compress(data)
+
+    def decode(self, data):
+        return self.decompressor.decompress(data)
+
+
+class ZstdDictCodec(ZstdCodec):
+    name = "zstd-dict"
+    trained = True
+
+
+CODECS = {codec.name: codec for codec in (BrotliCodec, ZlibCodec, ZstdCodec, ZstdDictCodec)}
+
+
+def make_codec(spec, dictionary=None):
+    """
+    Codec for a spec like "zstd-dict:19"; `dictionary` restores a trained codec
+    """
+    name, _, level = spec.partition(":")
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec {name}, expected one of {sorted(CODECS)}")
+    codec = CODECS[name](int(level), dictionary) if level else CODECS[name](dictionary=dictionary)
+    codec.spec = f"{name}:{codec.level}"
+    return codec
+
+
+def corpus_payloads(questions, without_images=False):
+    """
+    Raw HTML bytes of every question and solution in a list of question records
+    without_images swaps inline data: images for a short link, as an --assets build stores them
+    """
+    payloads = []
+    for q in questions:
+        for encoded in (q["question"], q["solutions"]["solution"]):
+            payload = brotli.decompress(base64.b64decode(encoded))
+            if without_images:
+                payload = DATA_URI.sub(b'src="/diagrams/0123456789abcdef0123.png"', payload)
+            payloads.append(payload)
+    return payloads
+
+
+def benchmark(payloads, specs, decode_repeat=3):
+    """
+    For each codec spec: build time (training + encoding every payload), total size including
+    any dictionary, and per-payload decode latency (mean and p99 over the best of `decode_repeat` runs)
+    """
+    results = {}
+    raw = sum(len(p) for p in payloads)
+    for spec in specs:
+        codec = make_codec(spec)
+        start = time.perf_counter()
+        codec.train(payloads)
+        encoded = [codec.encode(p) for p in payloads]
+        build = time.perf_counter() - start
+
+        latencies = []
+        for data in encoded:
+            best = None
+            for _ in range(decode_repeat):
+                start = time.perf_counter()
+                codec.decode(data)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            latencies.append(best)
+        latencies.sort()
+        dictionary = len(codec.dictionary or b"")
+        size = sum(len(e) for e in encoded) + dictionary
+        results[codec.spec] = {
+            "build_seconds": build,
+            "bytes": size,
+            "dictionary_bytes": dictionary,
+            "ratio": size / raw,
+            "decode_mean_us": sum(latencies) / len(latencies) * 1e6,
+            "decode_p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare payload codecs on the question corpus")
+    parser.add_argument("files", nargs="+", help="_questions.json files")
+    parser.add_argument("--codecs", nargs="+",
+                        default=["brotli:5", "brotli:9", "brotli:11", "zlib:9", "zstd:3", "zstd:19", "zstd-dict:3", "zstd-dict:19"])
+    parser.add_argument("--without-images", action="store_true", help="measure the HTML as an --assets build stores it")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    questions = []
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            questions.extend(json.load(f)["data"])
+    payloads = corpus_payloads(questions, args.without_images)
+    print(f"{len(payloads)} payloads, {sum(len(p) for p in payloads)} bytes of HTML")
+    results = benchmark(payloads, args.codecs)
+    for spec, r in results.items():
+        print(f"{spec:14} {r['bytes']:9} bytes ({r['ratio']:.3f})  build {r['build_seconds']:6.2f}s  "
+              f"decode {r['decode_mean_us']:7.1f}us mean {r['decode_p99_us']:7.1f}us p99")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
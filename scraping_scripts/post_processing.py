@@ -1,8 +1,73 @@
 import json
 import csv
 import math
+import os
 
-def generate_topic_ids(data):
+from instrumentation import metrics
+from json_stream import JsonArrayReader, JsonArrayWriter
+
+TOPIC_REGISTRY = "contest_data/topics.json"
+
+def load_topic_registry(path=TOPIC_REGISTRY):
+    """
+    The topic name -> id mapping shared by every contest
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)["topics"]
+    except FileNotFoundError:
+        return {}
+
+def save_topic_registry(registry, path=TOPIC_REGISTRY):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"topics": registry}, f, indent=2)
+
+def register_topics(registry, topics):
+    """
+    Give every topic not in the registry the next free id, in sorted order
+    Existing ids are never changed, so ids stay comparable across runs and contests
+    """
+    next_id = max(registry.values(), default=0) + 1
+    for topic in sorted(set(topics) - set(registry)):
+        registry[topic] = next_id
+        next_id += 1
+    return registry
+
+def topic_mask(ids):
+    """
+    Integer bitmask with bit `id` set for every topic id
+    """
+    mask = 0
+    for i in ids:
+        mask |= 1 << i
+    return mask
+
+def mask_topics(mask):
+    """
+    Topic ids of a bitmask, in increasing order
+    """
+    ids = []
+    i = 0
+    while mask:
+        if mask & 1:
+            ids.append(i)
+        mask >>= 1
+        i += 1
+    return ids
+
+def encode_mask(mask):
+    # Hex keeps masks exact in JSON once ids pass 53 bits (read with BigInt on the site)
+    return hex(mask)
+
+def add_topic_masks(problem):
+    """
+    Adds primaryMask/secondaryMask to a {primaryTopics, secondaryTopics} dict of topic ids
+    """
+    problem["primaryMask"] = encode_mask(topic_mask(problem["primaryTopics"]))
+    problem["secondaryMask"] = encode_mask(topic_mask(problem["secondaryTopics"]))
+    return problem
+
+def generate_topic_ids(data, registry=None):
     topic_set = set()
     
     # Collect all unique topics
@@ -11,23 +76,36 @@ def generate_topic_ids(data):
             topic_set.update(problem["primaryTopics"])
             topic_set.update(problem["secondaryTopics"])
     
-    # Assign unique IDs to topics
-    topic_list = sorted(topic_set)
-    topic_legend = {topic: i+1 for i, topic in enumerate(topic_list)}
+    if registry is None:
+        # Assign unique IDs to topics
+        topic_list = sorted(topic_set)
+        topic_legend = {topic: i+1 for i, topic in enumerate(topic_list)}
+    else:
+        # Use the shared registry ids, appending any topic it has not seen yet
+        register_topics(registry, topic_set)
+        topic_legend = {topic: registry[topic] for topic in sorted(topic_set)}
     
     # Replace topic names with IDs in the original data
     for year_data in data.values():
         for problem in year_data.values():
             problem["primaryTopics"] = [topic_legend[t] for t in problem["primaryTopics"]]
             problem["secondaryTopics"] = [topic_legend[t] for t in problem["secondaryTopics"]]
+            if registry is not None:
+                add_topic_masks(problem)
     
     return data, topic_legend
 
-def process_json(input_file, output_file):
+def process_json(input_file, output_file, registry_path=None):
+    """
+    Converts a topics file keyed by topic name into ids plus a legend
+    With registry_path, ids come from the shared registry (which is updated with new topics)
+    and every question also gets primary/secondary topic bitmasks
+    """
     with open(input_file, 'r') as f:
         data = json.load(f)
     
-    updated_data, legend = generate_topic_ids(data)
+    registry = load_topic_registry(registry_path) if registry_path else None
+    updated_data, legend = generate_topic_ids(data, registry)
     
     result = {
         "data": updated_data,
@@ -36,31 +114,70 @@ def process_json(input_file, output_file):
     
     with open(output_file, 'w') as f:
         json.dump(result, f, indent=2)
-def add_percentage_correct(questions, csv_filepath):
+    if registry_path:
+        save_topic_registry(registry, registry_path)
+
+def remap_topics(topics, old_legend, registry):
     """
-    Adds the percentage correct from a CSV file to a list of question dicts.
-    
-    The CSV is expected to have the columns:
+    Maps a question's topic ids from a per-contest legend to registry ids
+    Returns the new topics dict (None stays None)
+    """
+    if topics is None:
+        return None
+    names = {i: name for name, i in old_legend.items()}
+    problem = {
+        "primaryTopics": [registry[names[i]] for i in topics.get("primaryTopics", [])],
+        "secondaryTopics": [registry[names[i]] for i in topics.get("secondaryTopics", [])],
+    }
+    return add_topic_masks(problem)
+
+def migrate_to_registry(files, registry_path=TOPIC_REGISTRY):
+    """
+    Rewrites _id.json and _questions.json files that use their own legend to use registry ids
+    Every file's topics are registered first; files already on the registry are unchanged
+    Returns {file: {old id: new id}} so stored per-topic stats can be remapped too
+    """
+    registry = load_topic_registry(registry_path)
+    contents = {}
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            contents[path] = json.load(f)
+        register_topics(registry, contents[path]["legend"])
+
+    mappings = {}
+    for path, content in contents.items():
+        old_legend = content["legend"]
+        mappings[path] = {i: registry[name] for name, i in old_legend.items()}
+        if isinstance(content["data"], dict):
+            # _id.json: {year: {number: topics}}
+            for year_data in content["data"].values():
+                for number, topics in year_data.items():
+                    year_data[number] = remap_topics(topics, old_legend, registry)
+        else:
+            for question in content["data"]:
+                question["topics"] = remap_topics(question.get("topics"), old_legend, registry)
+        content["legend"] = {name: registry[name] for name in sorted(old_legend)}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(content, f, indent=2)
+
+    save_topic_registry(registry, registry_path)
+    return mappings
+
+def load_question_stats(csv_filepath, contest=None):
+    """
+    Reads (year, question number) -> percentage correct from a results CSV with the columns:
       - Question: the question number for that contest
       - Percentage Correct: the percentage of contestants who answered correctly
       - Year: the contest year
-    
-    The JSON questions should have a "source" key with:
-      - "year": the contest year
-      - "number": the question number within that contest
-    
-    Parameters:
-        questions (list): List of question dictionaries.
-        csv_filepath (str): Path to the CSV file containing question statistics.
-        
-    Returns:
-        list: Updated list of question dictionaries with an added "percentage_correct" key.
+      - Contest (optional): the contest name, as in the combined all_results.csv
+    Only rows whose Contest matches `contest` (case-insensitive) are used when it is given
     """
-    # Build a mapping from (year, question number) to percentage correct
     question_stats = {}
     with open(csv_filepath, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
+            if contest and row.get("Contest", "").lower() != contest.lower():
+                continue
             try:
                 year = int(row["Year"])
                 q_num = int(row["Question"])
@@ -70,9 +187,22 @@ def add_percentage_correct(questions, csv_filepath):
             except (KeyError, ValueError):
                 # Skip rows that don't have the expected format
                 continue
+    return question_stats
 
-    # Update each question in the JSON array with the corresponding percentage correct
-    for question in questions["data"]:
+def percentage_correct_enricher(question_stats, keep_existing=False):
+    """
+    Per-question transform setting "percentage_correct" from load_question_stats() output
+    
+    The questions should have a "source" key with:
+      - "year": the contest year
+      - "number": the question number within that contest (0-based)
+    With keep_existing, a question the stats have no row for keeps its current value
+    """
+    def enrich(question):
+        if keep_existing and question.get("percentage_correct") is not None:
+            key = (int(question["source"]["year"]), int(question["source"]["number"]) + 1)
+            if key not in question_stats:
+                return question
         # Ensure the question has the source details needed for matching
         if "source" in question and "year" in question["source"] and "number" in question["source"]:
             try:
@@ -84,36 +214,167 @@ def add_percentage_correct(questions, csv_filepath):
             question["percentage_correct"] = question_stats.get((q_year, q_number))
         else:
             question["percentage_correct"] = None
+        return question
+    return enrich
+
+def difficulty_curve_enricher(only_missing=False):
+    """
+    Per-question transform setting "percentage_correct" from a curve fitted on question number
+    """
+    def enrich(question):
+        if only_missing and question.get("percentage_correct") is not None:
+            return question
+        x = int(question["source"]["number"])+1
+        d = -0.00325384 * x**3 + 0.00798779 * x ** 2 + -1.9921642*x + 98.90434170400468
+        question["percentage_correct"] = round(d,2)
+        return question
+    return enrich
 
+def add_percentage_correct(questions, csv_filepath, contest=None):
+    """
+    Adds the percentage correct from a CSV file to a list of question dicts.
+    See load_question_stats for the CSV columns and percentage_correct_enricher for matching.
+    
+    Parameters:
+        questions (list): List of question dictionaries.
+        csv_filepath (str): Path to the CSV file containing question statistics.
+        contest (str): Only use rows whose Contest column matches this name (case-insensitive).
+        
+    Returns:
+        list: Updated list of question dictionaries with an added "percentage_correct" key.
+    """
+    enrich = percentage_correct_enricher(load_question_stats(csv_filepath, contest))
+    for question in questions["data"]:
+        enrich(question)
     return questions
 
-def add_difficulty_curve(questions):
+def add_difficulty_curve(questions, only_missing=False):
+    enrich = difficulty_curve_enricher(only_missing)
     for question in questions["data"]:
-       x = int(question["source"]["number"])+1
-       d = -0.00325384 * x**3 + 0.00798779 * x ** 2 + -1.9921642*x + 98.90434170400468
-       question["percentage_correct"] = round(d,2)
+       enrich(question)
     return questions
 
-def add_solution_data(questions, csv_filepath,output):
-    with open(questions, "r", encoding="utf-8") as f:
-        questions = json.load(f)
+def enrich_file(input_file, output_file, enrichers, indent=2):
+    """
+    Applies per-question transforms to a questions file in one streaming pass
     
+    Questions are read, passed through every enricher in order and written one at a time,
+    so memory stays bounded by a single question and any number of enrichers costs one
+    read and one write. The output matches json.dump(questions, f, indent=indent)
+    input_file and output_file may be the same file
+    Returns the number of questions written
+    """
+    tmp = output_file + ".tmp"
+    with open(input_file, "r", encoding="utf-8") as f, open(tmp, "w", encoding="utf-8") as out:
+        reader = JsonArrayReader(f)
+        writer = JsonArrayWriter(out, indent=indent)
+        with metrics.stage("enrich"):
+            for question in reader:
+                for enrich in enrichers:
+                    question = enrich(question)
+                writer.write(question)
+        writer.close(reader.members)
+    os.replace(tmp, output_file)
+    metrics.count("questions_enriched", writer.count)
+    return writer.count
+
+def add_solution_data(questions, csv_filepath,output):
     # Update questions by adding percentage correct from the CSV
-    updated_questions = add_percentage_correct(questions, csv_filepath)
-    
-    # Optionally, write the updated questions back to a new JSON file
-    with open(output, "w", encoding="utf-8") as f:
-        json.dump(updated_questions, f, indent=2)
+    enrich_file(questions, output, [percentage_correct_enricher(load_question_stats(csv_filepath))])
 def add_solution_curve(questions, output):
-    with open(questions, "r", encoding="utf-8") as f:
-        questions = json.load(f)
-    
-    # Update questions by adding percentage correct from the CSV
-    updated_questions = add_difficulty_curve(questions)
-    
-    # Optionally, write the updated questions back to a new JSON file
-    with open(output, "w", encoding="utf-8") as f:
-        json.dump(updated_questions, f, indent=2)
-# process_json("contest_data/gauss8/gauss8.json","contest_data/gauss8/gauss8_id.json")
-# add_solution_data("contest_data/pascal/pascal_questions.json","test/all_pascal_results.csv","contest_data/pascal/pascal_questions.json")
-add_solution_curve("contest_data/gauss8/gauss8_questions.json","contest_data/gauss8/gauss8_questions.json")
\ No newline at end of file
+    # Update questions by adding percentage correct from the difficulty curve
+    enrich_file(questions, output, [difficulty_curve_enricher()])
+def add_results_data(questions, csv_filepath, contest, output):
+    """
+    Sets percentage_correct from a combined results CSV (see scrape_solution_pdf.process_results_pdfs),
+    or a list of them (later files win for the same question)
+    Questions the CSVs have no row for keep the value they already have; the estimated
+    difficulty curve only fills in questions that never had one
+    """
+    paths = [csv_filepath] if isinstance(csv_filepath, str) else csv_filepath
+    question_stats = {}
+    for path in paths:
+        question_stats.update(load_question_stats(path, contest))
+    missing = [0]
+
+    def count_missing(question):
+        if question.get("percentage_correct") is None:
+            missing[0] += 1
+        return question
+
+    enrich_file(questions, output, [
+        percentage_correct_enricher(question_stats, keep_existing=True),
+        count_missing,
+        difficulty_curve_enricher(only_missing=True),
+    ])
+    metrics.count("difficulty_curve_fallbacks", missing[0])
+
+def build_index(questions):
+    """
+    Builds the lookup structures the question selector needs from a questions dict
+    (the contents of a <contest>_questions.json file)
+
+    Questions are referred to by their position in questions["data"]
+    Returns a dict with:
+      - columns: per-question year, number, percentage_correct and the precomputed
+        difficulty weight log((100 - percentage_correct) / 2) + 1 used by selectNextQuestion
+      - primary/secondary: topic ids of each question in CSR form (offsets into a flat id list)
+      - postings: topic id -> indices of the questions tagged with it, once per tag, so a
+        topic listed as both primary and secondary appears twice like in getQuestionTopics
+    """
+    columns = {"year": [], "number": [], "percentage_correct": [], "difficulty_weight": [], "topic_count": []}
+    primary = {"offsets": [0], "ids": []}
+    secondary = {"offsets": [0], "ids": []}
+    postings = {}
+
+    for i, question in enumerate(questions["data"]):
+        columns["year"].append(int(question["source"]["year"]))
+        columns["number"].append(int(question["source"]["number"]))
+
+        percentage = question.get("percentage_correct")
+        columns["percentage_correct"].append(percentage)
+        # A missing percentage reads as 0 on the site (100 - null == 100)
+        difficulty = 100 - (percentage or 0)
+        columns["difficulty_weight"].append(math.log(difficulty / 2) + 1 if difficulty > 0 else None)
+
+        topics = question.get("topics") or {}
+        p = topics.get("primaryTopics", [])
+        s = topics.get("secondaryTopics", [])
+        primary["ids"].extend(p)
+        primary["offsets"].append(len(primary["ids"]))
+        secondary["ids"].extend(s)
+        secondary["offsets"].append(len(secondary["ids"]))
+        # Questions without topic data get the selector's fixed default weight
+        columns["topic_count"].append(len(p) + len(s) if question.get("topics") else 0)
+        for topic in p + s:
+            postings.setdefault(str(topic), []).append(i)
+
+    return {
+        "count": len(questions["data"]),
+        "columns": columns,
+        "primary": primary,
+        "secondary": secondary,
+        "postings": postings,
+    }
+
+def add_index(questions, output):
+    with metrics.stage("load"):
+        with open(questions, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+
+    with metrics.stage("enrich/index"):
+        index = build_index(questions)
+
+    with metrics.stage("write"):
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+
+if __name__ == "__main__":
+    # process_json("contest_data/gauss8/gauss8.json","contest_data/gauss8/gauss8_id.json")
+    # process_json("contest_data/gauss8/gauss8.json","contest_data/gauss8/gauss8_id.json",TOPIC_REGISTRY)
+    # migrate_to_registry(["contest_data/gauss7/gauss7_id.json","contest_data/gauss8/gauss8_id.json","contest_data/pascal/pascal_id.json","contest_data/pascal/pascal_questions.json"])
+    # add_solution_data("contest_data/pascal/pascal_questions.json","test/all_pascal_results.csv","contest_data/pascal/pascal_questions.json")
+    add_solution_curve("contest_data/gauss8/gauss8_questions.json","contest_data/gauss8/gauss8_questions.json")
+    # add_results_data("contest_data/pascal/pascal_questions.json","test/all_results.csv","pascal","contest_data/pascal/pascal_questions.json")
+    # add_index("contest_data/pascal/pascal_questions.json","contest_data/pascal/pascal_index.json")
+    # metrics.write("post_processing_report.json")
\ No newline at end of file
@@ -0,0 +1,162 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+# Same bands as api/getContest: 10 questions from 1-10, 10 from 11-20 and 5 from 21-25
+BANDS = ((0, 9, 10), (10, 19, 10), (20, 24, 5))
+
+
+def load_questions(questions_file):
+    with open(questions_file, "r", encoding="utf-8") as f:
+        return json.load(f)["data"]
+
+
+def question_arrays(questions):
+    """
+    Column arrays over the question list: source number, year, percentage correct (NaN when missing)
+    and a (questions x topics) boolean membership matrix over primary and secondary topic ids
+    """
+    number = np.array([q["source"]["number"] for q in questions], dtype=np.int16)
+    year = np.array([q["source"]["year"] for q in questions], dtype=np.int16)
+    percentage = np.array(
+        [np.nan if q.get("percentage_correct") is None else q["percentage_correct"] for q in questions]
+    )
+    topic_ids = [
+        (q.get("topics") or {}).get("primaryTopics", []) + (q.get("topics") or {}).get("secondaryTopics", [])
+        for q in questions
+    ]
+    topics = np.zeros((len(questions), max((max(t) for t in topic_ids if t), default=0) + 1), dtype=bool)
+    for i, ids in enumerate(topic_ids):
+        topics[i, ids] = True
+    return number, year, percentage, topics
+
+
+def eligible(number, year, percentage, topics, years=None, min_correct=None, max_correct=None, topic_ids=None):
+    """
+    Boolean mask of questions matching the year, difficulty and topic constraints
+    min_correct/max_correct bound percentage_correct; questions without one only pass when unbounded
+    topic_ids keeps questions tagged with at least one of the given topics
+    """
+    mask = np.ones(len(number), dtype=bool)
+    if years:
+        mask &= np.isin(year, years)
+    if min_correct is not None:
+        mask &= percentage >= min_correct
+    if max_correct is not None:
+        mask &= percentage <= max_correct
+    if topic_ids:
+        topic_ids = [t for t in topic_ids if t < topics.shape[1]]
+        mask &= topics[:, topic_ids].any(axis=1)
+    return mask
+
+
+def generate_sets(questions, count, seed=None, weights=None, **constraints):
+    """
+    Draw `count` problem sets at once, each 10/10/5 questions across the source.number bands
+    Within a set questions are drawn without replacement; every eligible question in a band is
+    equally likely unless `weights` is given: one non-negative weight per question shared by every
+    set (e.g. from selection.question_weights), or a (count x questions) matrix with one row per
+    set, so personalised sets for many learners come from one call. A question with weight 0 in a
+    row is never drawn for that set. Keyword constraints are passed to eligible()
+    Returns a (count x 25) array of indices into `questions`
+    """
+    rng = np.random.default_rng(seed)
+    number, year, percentage, topics = question_arrays(questions)
+    mask = eligible(number, year, percentage, topics, **constraints)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim == 1:
+            # One row broadcast over every set
+            weights = weights[None, :]
+        if weights.ndim != 2 or weights.shape[0] not in (1, count) or weights.shape[1] != len(questions):
+            raise ValueError(f"weights of shape {weights.shape} do not match {count} sets of {len(questions)} questions")
+        mask &= (weights > 0).any(axis=0)
+
+    columns = []
+    for low, high, size in BANDS:
+        pool = np.flatnonzero(mask & (number >= low) & (number <= high))
+        if len(pool) < size:
+            raise ValueError(f"Only {len(pool)} eligible questions numbered {low + 1}-{high + 1}, need {size}")
+        # Taking the smallest random keys in each row shuffles the pool independently for every set
+        # With weights, exponential keys scaled by 1/weight give weighted sampling without replacement
+        if weights is None:
+            keys = rng.random((count, len(pool)))
+        else:
+            pool_weights = weights[:, pool]
+            available = (pool_weights > 0).sum(axis=1).min()
+            if available < size:
+                raise ValueError(f"A weight row leaves only {available} questions numbered {low + 1}-{high + 1}, need {size}")
+            # A zero weight gives an infinite key, which is never among the smallest
+            with np.errstate(divide="ignore"):
+                keys = rng.exponential(size=(count, len(pool))) / pool_weights
+        picks = np.argpartition(keys, size - 1, axis=1)[:, :size]
+        columns.append(pool[picks])
+    return np.concatenate(columns, axis=1)
+
+
+def generate_sets_naive(questions, count, seed=None, **constraints):
+    """
+    Per-set loop equivalent of generate_sets(), kept as the benchmark baseline
+    """
+    rng = np.random.default_rng(seed)
+    number, year, percentage, topics = question_arrays(questions)
+    sets = []
+    for _ in range(count):
+        mask = eligible(number, year, percentage, topics, **constraints)
+        chosen = []
+        for low, high, size in BANDS:
+            pool = [i for i in range(len(questions)) if mask[i] and low <= number[i] <= high]
+            rng.shuffle(pool)
+            chosen.extend(pool[:size])
+        sets.append(chosen)
+    return np.array(sets)
+
+
+def write_sets(questions, sets, output):
+    """
+    Write problem sets as lists of {year, number} sources
+    """
+    result = [
+        [{"year": questions[i]["source"]["year"], "number": questions[i]["source"]["number"]} for i in row]
+        for row in sets.tolist()
+    ]
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"sets": result}, f)
+
+
+def benchmark(questions, count, **constraints):
+    for name, generate in (("vectorized", generate_sets), ("naive", generate_sets_naive)):
+        start = time.perf_counter()
+        generate(questions, count, seed=0, **constraints)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {count} sets in {elapsed:.3f}s ({count / elapsed:.0f} sets/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate 25-question problem sets from a _questions.json file")
+    parser.add_argument("questions_file")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--years", type=int, nargs="+")
+    parser.add_argument("--topics", type=int, nargs="+", help="keep questions tagged with any of these topic ids")
+    parser.add_argument("--min-correct", type=float, help="lowest percentage_correct allowed")
+    parser.add_argument("--max-correct", type=float, help="highest percentage_correct allowed")
+    parser.add_argument("--output", default="problem_sets.json")
+    parser.add_argument("--benchmark", action="store_true", help="time against a per-set loop instead of writing sets")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions_file)
+    constraints = {
+        "years": args.years,
+        "topic_ids": args.topics,
+        "min_correct": args.min_correct,
+        "max_correct": args.max_correct,
+    }
+    if args.benchmark:
+        benchmark(questions, args.count, **constraints)
+    else:
+        sets = generate_sets(questions, args.count, args.seed, **constraints)
+        write_sets(questions, sets, args.output)
+        print(f"Saved {len(sets)} problem sets to {args.output}")
@@ -0,0 +1,305 @@
+import base64
+import json
+import math
+import mmap
+import os
+import struct
+
+from payload_codecs import DEFAULT_CODEC, make_codec
+
+# File layout (all little-endian):
+#   header: magic, question count, entry size, offset of the payload region
+#   topic layout: primary and secondary topic slots per entry and the bytes per topic id,
+#     sized from the questions being packed
+#   index:  one fixed-width entry per question, sorted by (year, number)
+#   payloads: raw brotli question and solution bytes, then the answers as utf-8 JSON
+# Payload offsets in the index are relative to the start of the payload region
+# A CEMCPK04 pack has a codec header between the topic layout and the index: the codec spec
+# (e.g. "zstd-dict:19", NUL padded), the dictionary size and the dictionary bytes,
+# and its question and solution payloads are encoded with that codec instead of brotli
+# CEMCPK01/CEMCPK02 packs have no topic layout and always use LEGACY_LAYOUT
+MAGIC = b"CEMCPK03"
+CODEC_MAGIC = b"CEMCPK04"
+LEGACY_MAGICS = {b"CEMCPK01": False, b"CEMCPK02": True}
+HEADER = struct.Struct("<8sIII")
+TOPIC_LAYOUT = struct.Struct("<BBBx")
+CODEC_HEADER = struct.Struct("<16sI")
+LEGACY_LAYOUT = (4, 6, 1)
+
+HAS_TOPICS = 1
+HAS_PERCENTAGE = 2
+
+
+def entry_struct(primary_slots, secondary_slots, width):
+    return struct.Struct(f"<HBBf{primary_slots * width}s{secondary_slots * width}sIIIIII")
+
+
+def _topic_lists(q):
+    topics = q.get("topics") or {}
+    return topics.get("primaryTopics", []), topics.get("secondaryTopics", [])
+
+
+def topic_layout(questions):
+    """
+    (primary slots, secondary slots, bytes per id) wide enough for every question's topics
+    Raises ValueError for ids the format cannot hold (0 marks an empty slot)
+    """
+    primary_slots = secondary_slots = 0
+    largest = 0
+    for q in questions:
+        primary, secondary = _topic_lists(q)
+        for i in primary + secondary:
+            if not isinstance(i, int) or not 0 < i < 1 << 32:
+                raise ValueError(f"Topic id {i!r} of {q['source']} cannot be packed")
+            largest = max(largest, i)
+        primary_slots = max(primary_slots, len(primary))
+        secondary_slots = max(secondary_slots, len(secondary))
+    if max(primary_slots, secondary_slots) > 255:
+        raise ValueError("More than 255 topics on one question")
+    width = 1 if largest < 1 << 8 else 2 if largest < 1 << 16 else 4
+    return primary_slots, secondary_slots, width
+
+
+def _topic_bytes(ids, slots, width):
+    return b"".join(i.to_bytes(width, "little") for i in ids) + bytes((slots - len(ids)) * width)
+
+
+def _topic_ids(data, width):
+    ids = (int.from_bytes(data[i:i + width], "little") for i in range(0, len(data), width))
+    return [i for i in ids if i]
+
+
+def _recode(questions, codec):
+    """
+    Question and solution payloads of every record re-encoded with a payload_codecs codec,
+    training its dictionary (if it has one) on the whole set first
+    """
+    source = make_codec(DEFAULT_CODEC)
+    html = []
+    for q in questions:
+        html.append(source.decode(base64.b64decode(q["question"])))
+        html.append(source.decode(base64.b64decode(q["solutions"]["solution"])))
+    codec.train(html)
+    return [codec.encode(payload) for payload in html]
+
+
+def write_pack(questions, path, codec=None):
+    """
+    Write question records (as found in <contest>_questions.json "data") to a packed container
+    The base64 payloads are stored as raw brotli bytes, or re-encoded with `codec`
+    (a spec like "zstd-dict:19") in a CEMCPK04 pack
+    """
+    questions = sorted(questions, key=lambda q: (q["source"]["year"], q["source"]["number"]))
+    layout = topic_layout(questions)
+    primary_slots, secondary_slots, width = layout
+    entry = entry_struct(*layout)
+    codec = make_codec(codec) if codec else None
+    encoded = _recode(questions, codec) if codec else None
+    index = []
+    payloads = []
+    offset = 0
+    for i, q in enumerate(questions):
+        if codec:
+            question, solution = encoded[2 * i], encoded[2 * i + 1]
+        else:
+            question = base64.b64decode(q["question"])
+            solution = base64.b64decode(q["solutions"]["solution"])
+        meta = json.dumps({"answers": q["answers"], "ans": q["solutions"]["ans"]}, separators=(",", ":")).encode("utf-8")
+
+        flags = HAS_TOPICS if q.get("topics") else 0
+        primary, secondary = _topic_lists(q)
+        percentage = q.get("percentage_correct")
+        if percentage is not None:
+            flags |= HAS_PERCENTAGE
+        else:
+            percentage = math.nan
+
+        index.append(entry.pack(
+            q["source"]["year"], q["source"]["number"], flags, percentage,
+            _topic_bytes(primary, primary_slots, width), _topic_bytes(secondary, secondary_slots, width),
+            offset, len(question),
+            offset + len(question), len(solution),
+            offset + len(question) + len(solution), len(meta),
+        ))
+        payloads.extend([question, solution, meta])
+        offset += len(question) + len(solution) + len(meta)
+
+    codec_header = b""
+    if codec:
+        dictionary = codec.dictionary or b""
+        codec_header = CODEC_HEADER.pack(codec.spec.encode("ascii"), len(dictionary)) + dictionary
+    data_offset = HEADER.size + TOPIC_LAYOUT.size + len(codec_header) + entry.size * len(index)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(CODEC_MAGIC if codec else MAGIC, len(index), entry.size, data_offset))
+        f.write(TOPIC_LAYOUT.pack(*layout))
+        f.write(codec_header)
+        f.writelines(index)
+        f.writelines(payloads)
+    os.replace(tmp, path)
+
+
+class QuestionPack:
+    """
+    Memory-mapped reader for a packed question container
+    Lookups binary-search the index and only touch the pages holding the requested payloads
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, entry_size, self.data_offset = HEADER.unpack_from(self.map, 0)
+        if magic in LEGACY_MAGICS:
+            has_codec = LEGACY_MAGICS[magic]
+            layout = LEGACY_LAYOUT
+            self.index_offset = HEADER.size
+        elif magic in (MAGIC, CODEC_MAGIC):
+            has_codec = magic == CODEC_MAGIC
+            layout = TOPIC_LAYOUT.unpack_from(self.map, HEADER.size)
+            self.index_offset = HEADER.size + TOPIC_LAYOUT.size
+        else:
+            self.close()
+            raise ValueError(f"{path} is not a question pack")
+        self.entry_struct = entry_struct(*layout)
+        self.topic_width = layout[2]
+        if entry_size != self.entry_struct.size:
+            self.close()
+            raise ValueError(f"{path} has entries of {entry_size} bytes, expected {self.entry_struct.size}")
+        self.codec_spec = DEFAULT_CODEC
+        dictionary = None
+        if has_codec:
+            spec, size = CODEC_HEADER.unpack_from(self.map, self.index_offset)
+            self.codec_spec = spec.rstrip(b"\0").decode("ascii")
+            start = self.index_offset + CODEC_HEADER.size
+            dictionary = self.map[start:start + size] or None
+            self.index_offset = start + size
+        self.codec = make_codec(self.codec_spec, dictionary)
+
+    def close(self):
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _entry(self, i):
+        return self.entry_struct.unpack_from(self.map, self.index_offset + i * self.entry_struct.size)
+
+    def _find(self, year, number):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            if (entry[0], entry[1]) < (year, number):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            entry = self._entry(lo)
+            if (entry[0], entry[1]) == (year, number):
+                return entry
+        raise KeyError((year, number))
+
+    def _slice(self, offset, length):
+        start = self.data_offset + offset
+        return self.map[start:start + length]
+
+    def entry(self, year, number):
+        """
+        Index metadata for one question, without reading any payload
+        """
+        year, number, flags, percentage, primary, secondary = self._find(year, number)[:6]
+        return {
+            "topics": {
+                "primaryTopics": _topic_ids(primary, self.topic_width),
+                "secondaryTopics": _topic_ids(secondary, self.topic_width),
+            } if flags & HAS_TOPICS else None,
+            "source": {"year": year, "number": number},
+            "percentage_correct": round(percentage, 2) if flags & HAS_PERCENTAGE else None,
+        }
+
+    def _brotli(self):
+        if self.codec.name != "brotli":
+            raise ValueError(f"Payloads are encoded with {self.codec_spec}, not brotli")
+
+    def question_br(self, year, number):
+        """
+        Raw brotli bytes of the question HTML, suitable for serving with Content-Encoding: br
+        """
+        self._brotli()
+        entry = self._find(year, number)
+        return self._slice(entry[6], entry[7])
+
+    def solution_br(self, year, number):
+        """
+        Raw brotli bytes of the solution HTML
+        """
+        self._brotli()
+        entry = self._find(year, number)
+        return self._slice(entry[8], entry[9])
+
+    def question_html(self, year, number):
+        """
+        Decoded question HTML, whichever codec the pack was written with
+        """
+        entry = self._find(year, number)
+        return self.codec.decode(self._slice(entry[6], entry[7])).decode("utf-8")
+
+    def solution_html(self, year, number):
+        entry = self._find(year, number)
+        return self.codec.decode(self._slice(entry[8], entry[9])).decode("utf-8")
+
+    def get(self, year, number):
+        """
+        One question in the same shape as a <contest>_questions.json record,
+        with the question and solution as raw bytes of the pack's codec instead of base64
+        """
+        entry = self._find(year, number)
+        record = self.entry(year, number)
+        meta = json.loads(self._slice(entry[10], entry[11]))
+        record["question"] = self._slice(entry[6], entry[7])
+        record["answers"] = meta["answers"]
+        record["solutions"] = {"solution": self._slice(entry[8], entry[9]), "ans": meta["ans"]}
+        return record
+
+    def keys(self):
+        """
+        (year, number) of every question, in order
+        """
+        return [tuple(self._entry(i)[:2]) for i in range(self.count)]
+
+
+def pack_path(questions_file):
+    return os.path.splitext(questions_file)[0] + ".pack"
+
+
+def pack_json(questions_file, output=None, codec=None):
+    """
+    Convert a <contest>_questions.json file into a .pack next to it
+    """
+    with open(questions_file, "r", encoding="utf-8") as f:
+        questions = json.load(f)["data"]
+    output = output or pack_path(questions_file)
+    write_pack(questions, output, codec)
+    return output
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack _questions.json files for memory-mapped lookups")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--codec", help='re-encode payloads, e.g. "zstd-dict:19" (default: keep the brotli bytes)')
+    args = parser.parse_args()
+
+    for questions_file in args.files:
+        output = pack_json(questions_file, codec=args.codec)
+        print(f"Packed {questions_file} ({os.path.getsize(questions_file)} bytes) into {output} ({os.path.getsize(output)} bytes)")
@@ -0,0 +1,352 @@
+import argparse
+import base64
+import glob
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import brotli
+import numpy as np
+
+from post_processing import build_index
+from problem_sets import BANDS
+from selection import SelectionIndex, select_question
+
+CONTEST_FILES = "../site/static/contest_files"
+CACHE_SIZE = 2048
+# Share of each request kind in a load test: topic=0 random question, weighted question, mock contest
+REQUEST_MIX = {"random": 0.6, "weighted": 0.3, "contest": 0.1}
+
+
+class PayloadCache:
+    """
+    Bounded LRU of decoded HTML, keyed by the base64 brotli payload itself
+    (Python caches a string's hash, so lookups do not rehash the payload)
+    A capacity of 0 turns caching off and every payload is decoded, like the site does
+    """
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def decode(self, payload):
+        if self.capacity:
+            with self.lock:
+                html = self.entries.get(payload)
+                if html is not None:
+                    self.entries.move_to_end(payload)
+                    self.hits += 1
+                    return html
+        html = brotli.decompress(base64.b64decode(payload)).decode("utf-8")
+        with self.lock:
+            self.misses += 1
+            if self.capacity:
+                self.entries[payload] = html
+                if len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return html
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QuestionService:
+    """
+    The site's question-serving endpoints over the same <contest>_questions.json files
+    Records on disk stay compressed; responses are built from new dicts, so the stored
+    records are never copied whole or mutated (the site deep-copies them through JSON)
+    """
+
+    def __init__(self, directory=CONTEST_FILES, cache_size=CACHE_SIZE, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.rng_lock = threading.Lock()
+        self.contests = {}
+        self.indexes = {}
+        for path in sorted(glob.glob(os.path.join(directory, "*_questions.json"))):
+            contest = os.path.basename(path)[:-len("_questions.json")]
+            with open(path, "r", encoding="utf-8") as f:
+                self.contests[contest] = json.load(f)
+            if all("question" in q for q in self.contests[contest]["data"]):
+                self.indexes[contest] = SelectionIndex(build_index(self.contests[contest]))
+        self.cache = PayloadCache(cache_size)
+
+    def _contest(self, contest):
+        if contest not in self.contests:
+            raise KeyError(f"Unknown contest {contest}")
+        return self.contests[contest]
+
+    def _decoded(self, record):
+        if "subQuestions" in record:
+            return {
+                **record,
+                "base": self.cache.decode(record["base"]) if record.get("base") else record.get("base"),
+                "subQuestions": [
+                    {**sub, "html": self.cache.decode(sub["html"]), "solution": self.cache.decode(sub["solution"])}
+                    for sub in record["subQuestions"]
+                ],
+            }
+        return {
+            **record,
+            "question": self.cache.decode(record["question"]),
+            "solutions": {**record["solutions"], "solution": self.cache.decode(record["solutions"]["solution"])},
+        }
+
+    def question(self, contest, stats=None):
+        """
+        api/getQuestion: a uniformly random question, or one picked by selectNextQuestion's
+        weights when the user's Stats are given (the site's topic != 0 case)
+        """
+        c = self._contest(contest)
+        with self.rng_lock:
+            if stats is None or contest not in self.indexes:
+                i = int(self.rng.integers(len(c["data"])))
+            else:
+                i = select_question(self.indexes[contest], stats, self.rng)
+        record = c["data"][i]
+        return {"question": self._decoded(record), "legend": c.get("legend")}
+
+    def contest(self, contest, year=None):
+        """
+        api/getContest: up to 10/10/5 random questions from source numbers 1-10, 11-20 and 21-25,
+        optionally from one year
+        """
+        c = self._contest(contest)
+        data = c["data"]
+        if year is not None:
+            data = [q for q in data if q["source"]["year"] == year]
+        selected = []
+        for low, high, size in BANDS:
+            band = [q for q in data if low <= q["source"]["number"] <= high]
+            with self.rng_lock:
+                picks = self.rng.choice(len(band), min(size, len(band)), replace=False)
+            selected.extend(band[i] for i in picks)
+        return {"questions": [self._decoded(q) for q in selected], "legend": c.get("legend")}
+
+
+class QuestionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive requests stall ~40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/metrics":
+            self._send(200, {"cache": self.server.service.cache.stats()})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        service = self.server.service
+        contest = params.get("contest", "").lower()
+        try:
+            if url.path == "/api/getQuestion":
+                stats = json.loads(body) if int(params.get("topic", "0")) != 0 else None
+                self._send(200, service.question(contest, stats))
+            elif url.path == "/api/getContest":
+                year = int(params["year"]) if params.get("year") else None
+                self._send(200, service.contest(contest, year))
+            else:
+                self._send(404, {"error": "not found"})
+        except KeyError as e:
+            self._send(404, {"error": e.args[0]})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+
+
+def serve(service, host="127.0.0.1", port=8766):
+    """
+    Start the server on a background thread; returns it (call shutdown() to stop)
+    """
+    server = ThreadingHTTPServer((host, port), QuestionHandler)
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def random_stats(legend, rng):
+    """
+    A Stats body like the site keeps, with some history on a random subset of topics
+    """
+    topics = [str(t) for t in (legend or {}).values()]
+    topic_stats = {}
+    for topic in rng.sample(topics, min(len(topics), rng.randint(1, 8))):
+        total = rng.randint(1, 20)
+        correct = rng.randint(0, total)
+        topic_stats[topic] = {"total": total, "correct": correct, "incorrect": total - correct, "time": total * rng.uniform(1, 6)}
+    total = sum(s["total"] for s in topic_stats.values())
+    return {
+        "total": total,
+        "correct": sum(s["correct"] for s in topic_stats.values()),
+        "time": sum(s["time"] for s in topic_stats.values()),
+        "topicStats": topic_stats,
+    }
+
+
+def request_plan(service, count, mix=None, seed=0):
+    """
+    `count` (path, body) requests drawn from `mix` over every contest the service has
+    """
+    mix = mix or REQUEST_MIX
+    rng = random.Random(seed)
+    kinds = list(mix)
+    plan = []
+    for _ in range(count):
+        contest = rng.choice(list(service.contests))
+        kind = rng.choices(kinds, [mix[k] for k in kinds])[0]
+        if kind == "contest":
+            years = sorted({q["source"]["year"] for q in service.contests[contest]["data"]})
+            plan.append((f"/api/getContest?contest={contest}&year={rng.choice(years)}", b""))
+        elif kind == "weighted" and contest in service.indexes:
+            body = json.dumps(random_stats(service.contests[contest].get("legend"), rng)).encode("utf-8")
+            plan.append((f"/api/getQuestion?contest={contest}&topic=1", body))
+        else:
+            plan.append((f"/api/getQuestion?contest={contest}&topic=0", b""))
+    return plan
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def load_test(host, port, plan, concurrency=4):
+    """
+    Send every request of `plan` over `concurrency` keep-alive connections
+    Returns {"requests", "errors", "seconds", "requests_per_second", "p50_ms", "p99_ms", "mean_ms"}
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    position = iter(range(len(plan)))
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port)
+        connection.connect()
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                with lock:
+                    i = next(position, None)
+                if i is None:
+                    return
+                path, body = plan[i]
+                start = time.perf_counter()
+                connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status != 200:
+                        errors.append((path, response.status))
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+    }
+
+
+def compare_cache(directory, requests, concurrency=4, cache_size=CACHE_SIZE, port=8766, warmup=200, seed=0):
+    """
+    Run the same request plan against the server with the payload cache off and on
+    Returns {"off": load_test result, "on": load_test result plus cache stats}
+    """
+    results = {}
+    for name, size in (("off", 0), ("on", cache_size)):
+        service = QuestionService(directory, size, seed)
+        server = serve(service, port=port)
+        try:
+            if warmup:
+                load_test("127.0.0.1", port, request_plan(service, warmup, seed=seed + 1), concurrency)
+            service.cache.hits = service.cache.misses = service.cache.evictions = 0
+            result = load_test("127.0.0.1", port, request_plan(service, requests, seed=seed), concurrency)
+        finally:
+            server.shutdown()
+            server.server_close()
+        result["cache"] = service.cache.stats()
+        results[name] = result
+        print(f"cache {name:3}  {result['requests_per_second']:8.1f} req/s  p50 {result['p50_ms']:7.2f}ms  "
+              f"p99 {result['p99_ms']:7.2f}ms  hit rate {result['cache']['hit_rate']:.3f}  errors {result['errors']}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the question corpus like the site's api routes, or load-test it")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    run = subcommands.add_parser("serve", help="serve /api/getQuestion, /api/getContest and /metrics")
+    run.add_argument("--port", type=int, default=8766)
+    bench = subcommands.add_parser("bench", help="load-test the server with the payload cache off and on")
+    bench.add_argument("--requests", type=int, default=2000)
+    bench.add_argument("--concurrency", type=int, default=4)
+    bench.add_argument("--warmup", type=int, default=200, help="requests sent before measuring")
+    bench.add_argument("--port", type=int, default=8766)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--output", help="write the results as JSON")
+    for subcommand in (run, bench):
+        subcommand.add_argument("--contest-files", default=CONTEST_FILES, help="directory of <contest>_questions.json files")
+        subcommand.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="decoded payloads to keep, 0 for none")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        service = QuestionService(args.contest_files, args.cache_size)
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), QuestionHandler)
+        server.service = service
+        print(f"Serving {', '.join(service.contests)} on http://127.0.0.1:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        results = compare_cache(args.contest_files, args.requests, args.concurrency, args.cache_size, args.port, args.warmup, args.seed)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
@@ -1,5 +1,6 @@
-import requests
 from bs4 import BeautifulSoup
+from fetcher import Fetcher
+from http_cache import HttpCache
 import lzma
 import re
 
@@ -7,9 +8,7 @@ import re
 year = 2013;
 contest = "Pascal"
 url = f"https://cemc.uwaterloo.ca/sites/default/files/documents/{year}/{year}{contest}Solution.html"
-headers = {"Accept": "application/vnd.citationstyles.csl+json"}
-response = requests.get(url, headers=headers)
-metadata = response.text
+metadata = Fetcher(workers=1, cache=HttpCache()).get(url)
 
 
 # Optionally, write the metadata to a file (similar to writeFileSync)
@@ -1,86 +1,159 @@
-import requests
 from bs4 import BeautifulSoup, NavigableString, Tag
+import argparse
 import json
-import re
-import base64
+import hashlib
 import os
-import brotli
+import time
+
+from compression import iter_compress, report
+from fetcher import BatchPrefetcher, Fetcher
+import lxml_parser
+from http_cache import MODES, HttpCache
+from instrumentation import metrics
+from assets import ASSET_DIR, ASSET_URL, AssetStore
+from corpus_db import CorpusStore
+from grading_context import add_grading
+from journal import Journal, journal_path, read_journal
+from json_stream import detect_indent
+from math_render import MATH_CACHE, MathRenderer
+from question_pack import pack_path, write_pack
+
+BASE_URL = "https://cemc.uwaterloo.ca/sites/default/files/documents"
+
+# Page names on the CEMC site, and which top-level <ol> of the solution page holds the contest
+# Gauss 7 and Gauss 8 share one solution page (grade 7 first, grade 8 second)
+CONTESTS = {
+    "gauss7": {"contest": "Gauss7Contest", "solution": "GaussSolution", "solution_index": 0},
+    "gauss8": {"contest": "Gauss8Contest", "solution": "GaussSolution", "solution_index": 1},
+    "pascal": {"contest": "PascalContest", "solution": "PascalSolution", "solution_index": 0},
+    "cayley": {"contest": "CayleyContest", "solution": "CayleySolution", "solution_index": 0},
+    "fermat": {"contest": "FermatContest", "solution": "FermatSolution", "solution_index": 0},
+}
+
+# One definition for both parsing engines, so their answers cannot drift apart
+ANSWER_PATTERN = lxml_parser.ANSWER_PATTERN
+
+
+def contest_urls(contest, year, base_url=BASE_URL):
+    """
+    Returns the (contest page, solution page) urls for a contest and year
+    """
+    pages = CONTESTS[contest]
+    return (
+        f"{base_url}/{year}/{year}{pages['contest']}.html",
+        f"{base_url}/{year}/{year}{pages['solution']}.html",
+    )
+
+
+def find_questions(html):
+    """
+    Find the <li> of every question on a contest page
+    """
+    soup = BeautifulSoup(html, "lxml")
 
-# Fetch the metadata from the URL with the specified headers
-year = 2024;
-url = f"https://cemc.uwaterloo.ca/sites/default/files/documents/{year}/{year}Gauss8Contest.html"
-headers = {"Accept": "application/vnd.citationstyles.csl+json"}
-response = requests.get(url, headers=headers)
-response.encoding = "utf-8"
-
-
-metadata = response.text
-
-
-
-# Parse the HTML content using BeautifulSoup
-soup = BeautifulSoup(metadata, "lxml")
-
-
-# Read json id file
-with open('contest_data/gauss8/gauss8_id.json', 'r') as file:
-    topic_data = json.load(file)
-
-# Find all <ol> elements that are direct children of <body> and skip the first one
-questions = []
-body = soup.body
-if body:
-    # Find direct <ol> children of the body tag
-    ol_elements = [child for child in body.find_all("ol", attrs={'class': None},recursive=True)]
-
-    # Check for hide/show drawing button beside ordered list of description
-    button = soup.find('button')
-    if button:
-        div = button.find_next_sibling('div')
-        target_ol = div.find('ol') if div else None
-    else:
-        target_ol = None
+    # Find all <ol> elements that are direct children of <body> and skip the first one
+    questions = []
+    body = soup.body
+    if body:
+        # Find direct <ol> children of the body tag
+        ol_elements = [child for child in body.find_all("ol", attrs={'class': None},recursive=True)]
+
+        # Check for hide/show drawing button beside ordered list of description
+        button = soup.find('button')
+        if button:
+            div = button.find_next_sibling('div')
+            target_ol = div.find('ol') if div else None
+        else:
+            target_ol = None
+
+        # Skip the first <ol> element and iterate over the rest
+        for ol in ol_elements[1:]:
+            # On 2020 contest answers had type=a
+            if(ol.attrs.get("type")=="a"):
+                continue
+            if(ol == target_ol):
+                continue
+            # For each <ol>, add its direct <li> children to the questions list
+            lis = ol.find_all("li", recursive=False)
+            questions.extend(lis)
+    return questions
+
+
+def parse_questions(html, year):
+    """
+    Parse the first 25 questions of a contest page
+    Returns a list of (question_html, answers) where answers is None for open-ended questions
+    """
+    questions = find_questions(html)
+    question_data = []
+    for i in range(min(25, len(questions))):
+        isWeird = False;
+        index = 0
 
-    # Skip the first <ol> element and iterate over the rest
-    print(len(ol_elements))
-    for ol in ol_elements[1:]:
-        # On 2020 contest answers had type=a
-        if(ol.attrs.get("type")=="a"):
-            continue
-        if(ol == target_ol):
-            continue
-        # For each <ol>, add its direct <li> children to the questions list
-        lis = ol.find_all("li", recursive=False)
-        # print(str(ol.attrs))
-        questions.extend(lis)
+        question = questions[i]
+        # Try to find an <ol> within the question (representing answers)
+        ans = None
 
-def get_solutions():
-    url = f"https://cemc.uwaterloo.ca/sites/default/files/documents/{year}/{year}GaussSolution.html"
-    response = requests.get(url, headers=headers)
-    response.encoding = "utf-8"
+        button = question.find("button")
 
-    metadata = response.text
+        answers = question.findAll("ol")
+        if(len(answers)<1 and year <2022):
+            isWeird = True
+            metrics.count("is_weird_fallback")
+            result_html = str(question)
+            next_sibling = question.next_sibling
+            while next_sibling:
+                # If we encounter a tag that is <li>, stop.
+                if isinstance(next_sibling, Tag) or isinstance(next_sibling, NavigableString):
+                    if next_sibling.name == "li":
+                        break
+                # Append the string representation (whether a Tag, comment, or NavigableString)
+                    result_html += str(next_sibling)
+                next_sibling = next_sibling.next_sibling
+            question = BeautifulSoup(result_html,"lxml").body
+            answers = question.findAll("ol")
+        if button:
+            if(len(answers)> 1):
+                index += 1
+        if(len(answers) > 0):
+            answers = answers[index]
+        else:
+            answers = None
 
+        # If answers exist, remove them from the question
+        if answers:
+            ans = BeautifulSoup(str(answers),"lxml")
+            answers.decompose()  # removes the element from the tree
+            answers = []
+            t = ans.find_all("li") # temprary element to hold list of answers
+            for answer in t:
+                if answer.text.strip() != "":
+                    answers.append(answer.text)
+                else:
+                    answers.append(answer.decode_contents())
+        if isWeird:
+            question = question.decode_contents()
 
-    # Optionally, write the metadata to a file (similar to writeFileSync)
-    # with open("main.html", "w", encoding="utf8") as f:
-    #     f.write(metadata)
+        # Get the outer HTML of the modified question element
+        question_html = str(question)
+        if(question_html == ''):
+            raise ValueError('Empty question at '+str(i))
+        question_data.append((question_html, answers))
+    return question_data
 
-    # Parse the HTML content using BeautifulSoup
-    soup = BeautifulSoup(metadata, "lxml")
 
+def parse_solutions(html, index):
+    """
+    Parse the first 25 solutions from the `index`th top-level <ol> of a solution page
+    Returns a list of (solution_html, ans) where ans is the answer letter or digits
+    """
+    soup = BeautifulSoup(html, "lxml")
 
-    # Find all <ol> elements that are direct children of <body> and skip the first one
+    # Find all <ol> elements that are direct children of <body>
     solutions = []
     body = soup.body
     if body:
-        # Find direct <ol> children of the body tag
-        ol = body.findAll("ol",{type:None},recursive=False)
-        button = body.find("button")
-        index = 1;
-        # if(len(ol) == 2 and button is None):
-        #     index = 1
-
+        ol = body.findAll("ol",recursive=False)
         lis = ol[index].find_all("li", recursive=False)
         solutions.extend(lis)
 
@@ -88,7 +161,6 @@ def get_solutions():
     solution_data = []
     for i in range(min(25, len(solutions))):
         solution = solutions[i]
-        # Try to find an <ol> within the question (representing answers)
         ans = None
         answer = solution.find_all("p")
         # If answers exist, remove them from the question
@@ -98,124 +170,445 @@ def get_solutions():
             else:
                 if "Answer" not in str(answer[-1]):
                     answer = answer[-2]
+                    metrics.count("q25_answer_fallback")
                 else:
                     answer = answer[-1]
             ans = str(answer);
             answer.decompose()  # removes the element from the tree
-    
+
         # Get the outer HTML of the modified question element
         solution_html = str(solution)
         if(solution_html == ''):
-            raise ValueError('Empty solution at '+i)
+            raise ValueError('Empty solution at '+str(i))
 
-        match = re.search(r"(?:<[^>]+>)*Answer(?::)?(?:</[^>]+>)*(?::\s*)?(?:<[^>]+>)*\s*(?:\((?P<letter>[A-Za-z]+)\)|(?:\\\()*(?P<digits>\d+)(?:\\\))*)",ans)
+        match = ANSWER_PATTERN.search(ans)
         ans = match.group('letter') or match.group('digits')
+        solution_data.append((solution_html, ans))
+    return solution_data
 
 
-        # Compress the HTML using lzma with a compression preset of 9
-        solution_compressed = brotli.compress(solution_html.encode("utf-8"), quality=11)
-        solution_base64 =base64.b64encode(solution_compressed).decode("utf-8")
-        solution_data.append({"solution":solution_base64, "ans":ans})
-    return solution_data
+# Both engines produce identical output; lxml parses each page once without the
+# serialize/reparse round-trips the BeautifulSoup path needs
+PARSERS = {
+    "bs4": (parse_questions, parse_solutions),
+    "lxml": (lxml_parser.parse_questions, lxml_parser.parse_solutions),
+}
+
+
+def content_hash(*parts):
+    """
+    Short sha256 of one or more HTML strings, used to detect unchanged sources
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def build_questions(contest, year, contest_html, solution_html, topic_data, existing=None, parser="lxml", journaled=None):
+    """
+    Parse a contest/solution page pair into question records ready for <contest>_questions.json
+    `existing` maps (year, number) to records already on disk; a record whose source hash is
+    unchanged is reused instead of being compressed again
+    `journaled` maps (year, number) to the source hash of records already in the journal;
+    those are left out entirely, as the journal supplies them when it is folded in
+    New records hold raw HTML until they go through compress_records()
+    Returns (records, new records)
+    """
+    existing = existing or {}
+    parse_contest, parse_solution = PARSERS[parser]
+    questions = parse_contest(contest_html, year)
+    solutions = parse_solution(solution_html, CONTESTS[contest]["solution_index"])
+    metrics.count("questions_parsed", len(questions))
 
-output_file = f"contest_data/gauss8/gauss8_questions.json"
-if os.path.exists(output_file):
-    with open(output_file, "r", encoding="utf8") as json_file:
-            question_data = json.load(json_file)["data"]
-else:
     question_data = []
+    pending = []
+    for i, (question_html, answers) in enumerate(questions):
+        topics = topic_data['data'].get(str(year), {})
+        topics = topics.get(str(i+1), None)
+
+        solution_html, ans = solutions[i]
+        digest = content_hash(question_html, solution_html)
+        if journaled and journaled.get((year, i)) == digest:
+            continue
+        old = existing.get((year, i))
+        if old is not None and old["source"].get("hash") == digest:
+            metrics.count("questions_unchanged")
+            question_data.append({**old, "topics": topics})
+            continue
 
-# Process the first 25 questions
-solutions = get_solutions()
-for i in range(min(25, len(questions))):
-    isWeird = False;
-    index = 0
-
-
-    question = questions[i]
-    # Try to find an <ol> within the question (representing answers)
-    ans = None
-    
-    button = question.find("button")
- 
-    answers = question.findAll("ol")
-    if(len(answers)<1 and year <2022):
-        isWeird = True
-        result_html = str(question)
-        next_sibling = question.next_sibling
-        while next_sibling:
-            # If we encounter a tag that is <li>, stop.
-            if isinstance(next_sibling, Tag) or isinstance(next_sibling, NavigableString):
-                if next_sibling.name == "li":
-                    break
-            # Append the string representation (whether a Tag, comment, or NavigableString)
-                result_html += str(next_sibling)
-            next_sibling = next_sibling.next_sibling
-        question = BeautifulSoup(result_html,"lxml").body
-        answers = question.findAll("ol")
-    if button:
-        if(len(answers)> 1):
-            index += 1
-    if(len(answers) > 0):
-        answers = answers[index]
-    else:
-        answers = None
-
-
-    # If answers exist, remove them from the question
-    if answers:
-        ans = BeautifulSoup(str(answers),"lxml")
-        answers.decompose()  # removes the element from the tree
-        answers = []
-        t = ans.find_all("li") # temprary element to hold list of answers
-        for answer in t:
-            if answer.text.strip() != "":
-                answers.append(answer.text)
-            else:
-                answers.append(answer.decode_contents())
-    if isWeird:
-        question = question.decode_contents()
-
-
-    # Get the outer HTML of the modified question element
-    # print(i)
-    question_html = str(question)
-    if(question_html == ''):
-        raise ValueError('Empty question at '+i)
-    # if(answers == None):
-    #     print("Skipping question "+str(i+1))
-    #     continue
-    # if(len(answers)<1):
-    #     raise ValueError('Empty answer at '+str(i))
-    topics = topic_data['data'].get(str(year), {})
-    topics = topics.get(str(i+1), None)
-
-    # Compress the HTML using lzma with a compression preset of 9
-    question_compressed = brotli.compress(question_html.encode("utf-8"), quality=11)
-    question_base64 =base64.b64encode(question_compressed).decode("utf-8")
-    # if('\'' in question_html):
-    #     print("Look at question "+str(i+1))
-    #     print(question_base64)
-
-
-    question_data.append({
-        "question": question_base64,  # Store as hex to keep JSON readable
-        "answers": answers,
-        "solutions": solutions[i],
-        "topics": topics,
-        "source":{
-            "year":year,
-            "number":i
+        record = {
+            "question": question_html,
+            "answers": answers,
+            "solutions": {"solution": solution_html, "ans": ans},
+            "topics": topics,
+            "source":{
+                "year":year,
+                "number":i,
+                "hash":digest
+            }
         }
-    })
-
-
-output_file = f"contest_data/gauss8/gauss8_questions.json"
-with open(output_file, "w", encoding="utf8") as json_file:
-    json.dump({"data":question_data,"legend":topic_data["legend"]}, json_file, indent=4)
-
-print(f"Saved {len(question_data)} questions to {output_file}")
-
-    # For demonstration, print the length of the compressed data
-
-
+        question_data.append(record)
+        pending.append(record)
+    return question_data, pending
+
+
+def compress_records(pending, workers=None, journals=None):
+    """
+    Compress the question and solution HTML of (contest, record) pairs in place, in parallel
+    Each finished record is appended to journals[contest] when a Journal is given for its contest
+    Returns timed_compress() results without the compressed text
+    """
+    payloads = []
+    labels = []
+    for contest, record in pending:
+        label = f"{contest} {record['source']['year']} Q{record['source']['number'] + 1}"
+        payloads.extend([record["question"], record["solutions"]["solution"]])
+        labels.extend([label + " question", label + " solution"])
+
+    start = time.perf_counter()
+    results = []
+    with metrics.stage("compress"):
+        for result in iter_compress(payloads, workers):
+            # Only the sizes and timings are kept; the payload lives on in the record (and journal)
+            results.append((None,) + result[1:])
+            if len(results) % 2:
+                question = result[0]
+                continue
+            # Both halves of a record are done
+            contest, record = pending[len(results) // 2 - 1]
+            record["question"] = question
+            record["solutions"]["solution"] = result[0]
+            if journals and contest in journals:
+                journals[contest].append(record)
+    report(results, time.perf_counter() - start, labels)
+    metrics.count("bytes_before_brotli", sum(r[2] for r in results))
+    metrics.count("bytes_after_brotli", sum(r[3] for r in results))
+    return results
+
+
+def load_topic_data(contest, data_dir):
+    path = os.path.join(data_dir, contest, f"{contest}_id.json")
+    if not os.path.exists(path):
+        return {"data": {}, "legend": {}}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def load_questions(output_file):
+    """
+    Load an existing _questions.json
+    Returns (data, sources) where sources maps year -> hash of the pages it was built from
+    """
+    if not os.path.exists(output_file):
+        return [], {}
+    with open(output_file, "r", encoding="utf8") as json_file:
+        questions = json.load(json_file)
+    return questions["data"], questions.get("sources", {})
+
+
+def upsert_questions(question_data, records):
+    """
+    Insert or replace records in question_data, keyed by (source.year, source.number)
+    Fields on an existing record that the scraper does not produce (e.g. percentage_correct) are kept,
+    except those derived from the page text when source.hash changes: the grading context and
+    source.duplicate_group (dedupe assigns the group again on its next run)
+    Returns the number of records that changed
+    """
+    positions = {(q["source"]["year"], q["source"]["number"]): i for i, q in enumerate(question_data)}
+    changed = 0
+    for record in records:
+        key = (record["source"]["year"], record["source"]["number"])
+        if key in positions:
+            old = question_data[positions[key]]
+            # source is merged too, so annotations such as source.duplicate_group survive a rebuild
+            new = {**old, **record, "source": {**old.get("source", {}), **record["source"]}}
+            if record["source"].get("hash") != old["source"].get("hash"):
+                # Both were derived from the old page text
+                if "grading" not in record:
+                    new.pop("grading", None)
+                if "duplicate_group" not in record["source"]:
+                    new["source"].pop("duplicate_group", None)
+            if new != old:
+                question_data[positions[key]] = new
+                changed += 1
+        else:
+            positions[key] = len(question_data)
+            question_data.append(record)
+            changed += 1
+    return changed
+
+
+def write_questions(output_file, question_data, legend, sources, pack_codec=None):
+    """
+    Write the _questions.json and its .pack
+    An existing file keeps its indent (post_processing writes 2), so a rebuild only changes the records that did
+    """
+    indent = detect_indent(output_file, default=4)
+    with metrics.stage(f"encode/{os.path.basename(output_file)}"):
+        encoded = json.dumps({"data":question_data,"legend":legend,"sources":sources}, indent=indent)
+    with metrics.stage(f"write/{os.path.basename(output_file)}"):
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        # The pack goes first: it rejects records it cannot hold before the JSON is touched,
+        # so a failure leaves the two files in step
+        write_pack(question_data, pack_path(output_file), pack_codec)
+        with open(output_file, "w", encoding="utf8") as json_file:
+            json_file.write(encoded)
+    metrics.count("bytes_written", len(encoded.encode("utf-8")))
+
+
+def compact_journal(output_file, legend=None, pack_codec=None):
+    """
+    Fold a journal left by an interrupted run into the _questions.json file and delete it
+    The years it covers keep their old source hash, so the next scrape re-parses them
+    (reusing the journaled records) and records the new hash
+    Returns the number of records that changed
+    """
+    question_data, sources = load_questions(output_file)
+    if legend is None and os.path.exists(output_file):
+        with open(output_file, "r", encoding="utf8") as json_file:
+            legend = json.load(json_file).get("legend", {})
+    changed = upsert_questions(question_data, read_journal(journal_path(output_file)))
+    if changed:
+        write_questions(output_file, question_data, legend or {}, sources, pack_codec)
+    Journal(journal_path(output_file)).remove()
+    return changed
+
+
+def scrape(contests, years, base_url=BASE_URL, data_dir="contest_data", workers=8, interval=0.2, cache=None, force=False, compress_workers=None, parser="lxml", math=None, math_failures=None, assets=None, store=None, pack_codec=None, grading=False):
+    """
+    Fetch every contest/solution page pair for the given contests and years concurrently,
+    then parse them and upsert the questions into each contest's _questions.json
+    Pages go through `cache` (an HttpCache) when one is given
+    Years whose pages are unchanged since the last build are skipped unless `force` is set
+    Compression runs on `compress_workers` processes (default: one per core)
+    `parser` picks the HTML parsing engine from PARSERS
+    `grading` stores a plain-text form of each new question and solution, with its token count,
+    for AI marking prompts (see grading_context)
+    `assets` (an assets.AssetStore) moves images out of the HTML into a content-addressed directory
+    `math` (a math_render.MathRenderer) pre-renders TeX to MathML before compression; expressions
+    it cannot convert are written to `math_failures`
+    `store` (a corpus_db.CorpusStore) receives every changed record and source hash as well
+    `pack_codec` (a payload_codecs spec) re-encodes the payloads of the .pack files; the JSON stays brotli
+    Every compressed record is journaled as it finishes; a rerun after a crash reuses the
+    journaled records instead of compressing them again, and the journal is deleted once the
+    questions file is written
+
+    Contests are built one after another, each in batches of years sized to keep the fetcher's
+    workers busy. The next batch (across contest boundaries too) downloads while the current one
+    is parsed and compressed, and a page two contests share (the Gauss solution page) is fetched
+    once and held until the second contest has used it
+    """
+    # A contest named twice on the command line is only built once
+    contests = list(dict.fromkeys(contests))
+    size = max(1, workers // 2)
+    plan = [(contest, years[start:start + size]) for contest in contests for start in range(0, len(years), size)]
+    fetcher = Fetcher(workers=workers, interval=interval, cache=cache)
+    prefetcher = BatchPrefetcher(fetcher, [
+        [url for year in batch_years for url in contest_urls(contest, year, base_url)] for contest, batch_years in plan
+    ])
+    try:
+        for contest in contests:
+            scrape_contest(contest, contest_batches(prefetcher, plan, contest), base_url, data_dir, force,
+                           compress_workers, parser, math, assets, store, pack_codec, grading)
+    finally:
+        fetcher.close()
+    if math is not None:
+        math.save(math_failures)
+        if math.failures:
+            print(f"Left {len(math.failures)} TeX expressions for the site to render, see {math_failures}")
+
+
+def contest_batches(prefetcher, plan, contest):
+    """
+    (years, pages, errors) for each batch of `plan` that belongs to `contest`
+    The "fetch" stage is the time spent waiting for pages that have not arrived yet
+    """
+    for i, (batch_contest, batch_years) in enumerate(plan):
+        if batch_contest == contest:
+            with metrics.stage("fetch"):
+                pages, errors = prefetcher.get(i)
+            yield batch_years, pages, errors
+
+
+def scrape_contest(contest, batches, base_url=BASE_URL, data_dir="contest_data", force=False, compress_workers=None, parser="lxml", math=None, assets=None, store=None, pack_codec=None, grading=False):
+    """
+    Build one contest for scrape() from `batches` of (years, pages, errors)
+
+    Years are parsed and compressed a batch at a time and each compressed record goes straight
+    to the journal, so only the batch being built (and the one downloading behind it) is in
+    memory as pages and raw HTML. The journal is then streamed into the upsert, so compressed
+    records are not collected either; memory holds the contest's questions file, two batches of
+    pages and any shared pages a later contest still needs, however many years are built
+    """
+    topic_data = load_topic_data(contest, data_dir)
+    output_file = os.path.join(data_dir, contest, f"{contest}_questions.json")
+    question_data, sources = load_questions(output_file)
+    built_from = dict(sources)
+    existing = {} if force else {(q["source"]["year"], q["source"]["number"]): q for q in question_data}
+    # Records journaled by an interrupted run were built by this code, so reuse them even with force;
+    # only their hashes are kept here, the records themselves are read back when the journal is folded in
+    path = journal_path(output_file)
+    journaled = {(r["source"]["year"], r["source"]["number"]): r["source"].get("hash") for r in read_journal(path)}
+    if journaled:
+        print(f"Resuming {contest}: {len(journaled)} questions journaled by an earlier run")
+        metrics.count("questions_resumed", len(journaled))
+
+    records = []
+    with Journal(path) as journal:
+        for batch_years, pages, errors in batches:
+            metrics.count("fetch_errors", len(errors))
+            for url, error in errors.items():
+                print(f"Failed to fetch {url}: {error}")
+
+            pending = []
+            for year in batch_years:
+                contest_url, solution_url = contest_urls(contest, year, base_url)
+                if contest_url not in pages or solution_url not in pages:
+                    print(f"Skipping {contest} {year}: pages unavailable")
+                    continue
+                page_hash = content_hash(pages[contest_url], pages[solution_url])
+                if not force and sources.get(str(year)) == page_hash:
+                    metrics.count("years_unchanged")
+                    print(f"Skipping {contest} {year}: unchanged")
+                    continue
+                try:
+                    with metrics.stage(f"parse/{contest}/{year}"):
+                        year_records, new = build_questions(contest, year, pages[contest_url], pages[solution_url],
+                                                            topic_data, existing, parser, journaled)
+                except (ValueError, IndexError, AttributeError) as e:
+                    # Keep going so one malformed page does not throw away the other years
+                    metrics.count("parse_errors")
+                    print(f"Failed to parse {contest} {year}: {e}")
+                    continue
+                # Only reused records are kept; new ones reach the upsert through the journal
+                new_ids = {id(r) for r in new}
+                records.extend(r for r in year_records if id(r) not in new_ids)
+                pending.extend((contest, record) for record in new)
+                sources[str(year)] = page_hash
+                resumed = sum(1 for y, _ in journaled if y == year)
+                print(f"Built {contest} {year}: {len(year_records) + resumed} questions, {len(year_records) - len(new)} unchanged"
+                      + (f", {resumed} resumed" if resumed else ""))
+            del pages
+
+            # Before assets and MathML rewrite the HTML, so the text keeps the TeX
+            if grading:
+                with metrics.stage("grading"):
+                    for _, record in pending:
+                        add_grading(record, compressed=False)
+
+            if assets is not None:
+                with metrics.stage("assets"):
+                    for _, record in pending:
+                        assets.rewrite_record(record, *contest_urls(contest, record["source"]["year"], base_url))
+
+            if math is not None:
+                with metrics.stage("mathml"):
+                    for _, record in pending:
+                        math.render_record(record)
+
+            compress_records(pending, compress_workers, {contest: journal})
+
+    # Reused records first, then everything journaled (by an earlier run or this one), streamed
+    keys = set()
+
+    def journal_records():
+        for record in read_journal(path):
+            keys.add((record["source"]["year"], record["source"]["number"]))
+            yield record
+
+    changed = upsert_questions(question_data, records)
+    changed += upsert_questions(question_data, journal_records())
+    keys.update((r["source"]["year"], r["source"]["number"]) for r in records)
+    if store is not None:
+        # Upsert the merged records so fields kept from disk (e.g. percentage_correct) are stored too
+        store.upsert_questions(contest, [q for q in question_data if (q["source"]["year"], q["source"]["number"]) in keys])
+        store.set_sources(contest, sources)
+        store.set_legend(contest, topic_data["legend"])
+        store.commit()
+    if changed == 0 and sources == built_from and os.path.exists(output_file):
+        Journal(path).remove()
+        print(f"No changes to {output_file}")
+        return
+
+    write_questions(output_file, question_data, topic_data["legend"], sources, pack_codec)
+    Journal(path).remove()
+    print(f"Saved {len(question_data)} questions ({changed} changed) to {output_file}")
+
+
+def parse_years(text):
+    """
+    Parse a year list like "2013-2024" or "2019,2021"
+    """
+    years = []
+    for part in text.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            years.extend(range(int(start), int(end) + 1))
+        else:
+            years.append(int(part))
+    return years
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape CEMC contest questions and solutions")
+    parser.add_argument("contests", nargs="+", choices=sorted(CONTESTS))
+    parser.add_argument("--years", type=parse_years, help='e.g. "2013-2024" or "2019,2021"')
+    parser.add_argument("--base-url", default=BASE_URL, help="point at a local server to scrape saved fixtures")
+    parser.add_argument("--data-dir", default="contest_data")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=0.2, help="minimum seconds between requests to one host")
+    parser.add_argument("--cache-dir", default=".http_cache")
+    parser.add_argument("--cache-mode", choices=MODES + ("off",), default="cache")
+    parser.add_argument("--force", action="store_true", help="re-parse and re-compress even when the source is unchanged")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default="lxml", help="HTML parsing engine")
+    parser.add_argument("--compress-workers", type=int, default=None, help="compression processes (default: one per core)")
+    parser.add_argument("--assets", action="store_true",
+                        help="store images once under --asset-dir and link to them instead of inlining them (use --force to rewrite an existing build)")
+    parser.add_argument("--asset-dir", default=ASSET_DIR)
+    parser.add_argument("--asset-url", default=ASSET_URL, help="url prefix the site serves --asset-dir from")
+    parser.add_argument("--reencode", action="store_true", help="re-encode stored PNG/JPEG images (needs Pillow)")
+    parser.add_argument("--max-width", type=int, help="downscale re-encoded images wider than this")
+    parser.add_argument("--mathml", action="store_true",
+                        help="pre-render TeX to MathML (needs latex2mathml; use --force to re-render an existing build)")
+    parser.add_argument("--math-cache", default=MATH_CACHE)
+    parser.add_argument("--math-failures", default="mathml_failures.json", help="where to list TeX that could not be converted")
+    parser.add_argument("--grading", action="store_true",
+                        help="store plain-text grading context with token counts (use --force to add it to an existing build)")
+    parser.add_argument("--pack-codec", help='payload codec for the .pack files, e.g. "zstd-dict:19" (default: the brotli bytes of the JSON)')
+    parser.add_argument("--db", help="also upsert into this corpus_db SQLite store, e.g. contest_data/corpus.sqlite")
+    parser.add_argument("--compact", action="store_true",
+                        help="only fold the journals left by an interrupted run into the questions files")
+    parser.add_argument("--report", help="write per-stage timings and counters to this JSON file")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                        help='run these stages under cProfile, e.g. "parse/pascal" or "compress" or "all"')
+    parser.add_argument("--profile-dir", default="profiles")
+    args = parser.parse_args()
+
+    metrics.configure(args.profile, args.profile_dir)
+    if args.compact:
+        for contest in args.contests:
+            output_file = os.path.join(args.data_dir, contest, f"{contest}_questions.json")
+            legend = load_topic_data(contest, args.data_dir)["legend"]
+            print(f"Compacted {compact_journal(output_file, legend, args.pack_codec)} journaled questions into {output_file}")
+    else:
+        if not args.years:
+            parser.error("--years is required unless --compact is given")
+        cache = None if args.cache_mode == "off" else HttpCache(args.cache_dir, args.cache_mode)
+        math = MathRenderer(args.math_cache) if args.mathml else None
+        assets = None
+        if args.assets:
+            assets = AssetStore(args.asset_dir, args.asset_url, Fetcher(workers=1, interval=args.interval, cache=cache),
+                                args.reencode, args.max_width)
+        store = CorpusStore(args.db) if args.db else None
+        try:
+            scrape(args.contests, args.years, args.base_url, args.data_dir, args.workers, args.interval, cache, args.force,
+                   args.compress_workers, args.parser, math, args.math_failures, assets, store, args.pack_codec, args.grading)
+        finally:
+            if store is not None:
+                store.close()
+    metrics.summary()
+    if args.report:
+        metrics.write(args.report)
+        print(f"Saved run report to {args.report}")
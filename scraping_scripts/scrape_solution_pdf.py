@@ -1,75 +1,158 @@
 import re
-import pandas as pd
-import PyPDF2
+import csv
 import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_text_from_pdf(pdf_path):
+from instrumentation import metrics
+
+# pandas and PyPDF2 are imported where they are used, so parsing cached PDFs into CSV
+# never loads pandas and only loads PyPDF2 when a page has to be extracted
+
+PAGE_CACHE_DIR = '.pdf_text_cache'
+
+# Multiple choice row: question_num correct_answer percentage_A percentage_B percentage_C percentage_D percentage_E
+MC_ROW = re.compile(r'^\s*(\d+)\s+([A-E])\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)(?:\s+([\d.]+))?')
+# Open-ended row (newer format): question_num answer_value answer_value (percentage)
+OPEN_ROW = re.compile(r'^\s*(\d+)\s+(\d+)(?:\s+\d+\s+\([\d.]+\))*\s+\2\s+\(([\d.]+)\)')
+CONTESTANTS = re.compile(r'Number of Contestants [^\d]*: (\d+)')
+AVERAGE_MARK = re.compile(r'Average mark [^\d]*: ([\d.]+)')
+FILENAME_YEAR = re.compile(r'(\d{4})')
+COVER_YEAR = re.compile(r'\b((?:19|20)\d{2})\b')
+PASCAL_FILENAME_YEAR = re.compile(r'(\d{4})Pascal')
+PASCAL_CONTENT_YEAR = re.compile(r'(\d{4})\s+Pascal Contest')
+
+def file_hash(path):
+    """
+    sha256 of a file's contents, used to key the extracted text cache
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def iter_pdf_pages(pdf_path, cache_dir=PAGE_CACHE_DIR):
+    """
+    Lazily yield the text of each page of a PDF file
+    Extracted text is cached on disk under cache_dir/<file hash>/, so pages that were
+    already extracted are read back without opening the PDF at all
+    Pass cache_dir=None to disable the cache
+    """
+    page_dir = None
+    page_count = None
+    if cache_dir:
+        page_dir = os.path.join(cache_dir, file_hash(pdf_path))
+        os.makedirs(page_dir, exist_ok=True)
+        count_path = os.path.join(page_dir, 'count')
+        if os.path.exists(count_path):
+            with open(count_path) as f:
+                page_count = int(f.read())
+
+    file = None
+    pdf_reader = None
+    try:
+        page_num = 0
+        while page_count is None or page_num < page_count:
+            page_path = os.path.join(page_dir, f'{page_num}.txt') if page_dir else None
+            if page_path and os.path.exists(page_path):
+                with open(page_path, 'r', encoding='utf-8') as f:
+                    yield f.read()
+                page_num += 1
+                continue
+
+            # Only parse the PDF once a page is missing from the cache
+            if pdf_reader is None:
+                import PyPDF2
+                file = open(pdf_path, 'rb')
+                pdf_reader = PyPDF2.PdfReader(file)
+                page_count = len(pdf_reader.pages)
+                if page_dir:
+                    with open(os.path.join(page_dir, 'count'), 'w') as f:
+                        f.write(str(page_count))
+                if page_num >= page_count:
+                    break
+
+            text = pdf_reader.pages[page_num].extract_text()
+            if page_path:
+                # Write then rename so a concurrent reader never sees a partial page
+                with open(page_path + '.tmp', 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(page_path + '.tmp', page_path)
+            yield text
+            page_num += 1
+    finally:
+        if file is not None:
+            file.close()
+
+def extract_text_from_pdf(pdf_path, cache_dir=PAGE_CACHE_DIR):
     """
     Extract text content from each page of a PDF file
     Returns a list of text content from each page
     """
-    page_texts = []
-    with open(pdf_path, 'rb') as file:
-        pdf_reader = PyPDF2.PdfReader(file)
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            page_texts.append(page.extract_text())
-    return page_texts
+    return list(iter_pdf_pages(pdf_path, cache_dir))
 
 def find_pascal_results_page(page_texts):
     """
     Find the page that contains Pascal Contest results
     Returns the text content of the first matching page
+    page_texts can be a lazy iterator such as iter_pdf_pages(); pages after the match are never extracted
     """
     for page_text in page_texts:
         if "Pascal Contest Concours Pascal" in page_text:
             return page_text
     return None
 
-def parse_pascal_results(text_content):
+def iter_result_rows(text_content):
     """
-    Parse Pascal Contest results from text content extracted from a PDF
-    Returns a DataFrame with question numbers and percentage of correct answers
+    Yield (question number, correct answer, percentage correct) for every results row in a page
     Handles both old format (all multiple choice) and new format (with open-ended questions)
     """
-    if text_content is None:
-        return pd.DataFrame()
-        
-    # Create a dictionary to store results
-    results = {'Question': [], 'Correct Answer': [], 'Percentage Correct': []}
-    
     # Split the content into lines
     lines = text_content.strip().split('\n')
-    
+
     # Process all questions, looking for both multiple choice and open-ended formats
     for line in lines:
         # Pattern for multiple choice questions
-        # Format: question_num correct_answer percentage_A percentage_B percentage_C percentage_D percentage_E
-        mc_match = re.match(r'^\s*(\d+)\s+([A-E])\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)(?:\s+([\d.]+))?', line)
+        mc_match = MC_ROW.match(line)
         if mc_match:
             question_num = int(mc_match.group(1))
             correct_answer = mc_match.group(2)
-            
+
             # Calculate column index for correct answer percentage
             col_indices = {'A': 3, 'B': 4, 'C': 5, 'D': 6, 'E': 7}
             percentage_correct = float(mc_match.group(col_indices[correct_answer]))
-            
-            results['Question'].append(question_num)
-            results['Correct Answer'].append(correct_answer)
-            results['Percentage Correct'].append(percentage_correct)
+
+            yield question_num, correct_answer, percentage_correct
             continue  # Go to next line after processing
-        
+
         # Pattern for open-ended questions (newer format)
-        # Format: question_num answer_value answer_value (percentage)
-        open_match = re.match(r'^\s*(\d+)\s+(\d+)(?:\s+\d+\s+\([\d.]+\))*\s+\2\s+\(([\d.]+)\)', line)
+        open_match = OPEN_ROW.match(line)
         if open_match:
             question_num = int(open_match.group(1))
             correct_answer = open_match.group(2)
             percentage_correct = float(open_match.group(3))
-            
-            results['Question'].append(question_num)
-            results['Correct Answer'].append(correct_answer)
-            results['Percentage Correct'].append(percentage_correct)
+
+            yield question_num, correct_answer, percentage_correct
+
+def parse_pascal_results(text_content):
+    """
+    Parse Pascal Contest results from text content extracted from a PDF
+    Returns a DataFrame with question numbers and percentage of correct answers
+    Handles both old format (all multiple choice) and new format (with open-ended questions)
+    """
+    import pandas as pd
+
+    if text_content is None:
+        return pd.DataFrame()
+        
+    # Create a dictionary to store results
+    results = {'Question': [], 'Correct Answer': [], 'Percentage Correct': []}
+    
+    for question_num, correct_answer, percentage_correct in iter_result_rows(text_content):
+        results['Question'].append(question_num)
+        results['Correct Answer'].append(correct_answer)
+        results['Percentage Correct'].append(percentage_correct)
     
     # Create and return a DataFrame
     df = pd.DataFrame(results)
@@ -88,23 +171,23 @@ def extract_contest_info(text_content, filename):
     info = {}
     
     # Look for number of contestants
-    contestants_match = re.search(r'Number of Contestants [^\d]*: (\d+)', text_content)
+    contestants_match = CONTESTANTS.search(text_content)
     if contestants_match:
         info['Number of Contestants'] = int(contestants_match.group(1))
     
     # Look for average mark
-    avg_mark_match = re.search(r'Average mark [^\d]*: ([\d.]+)', text_content)
+    avg_mark_match = AVERAGE_MARK.search(text_content)
     if avg_mark_match:
         info['Average Mark'] = float(avg_mark_match.group(1))
     
     # Try to extract year from filename or content
     # First try filename format like "2024PascalResults-15.pdf"
-    year_match = re.search(r'(\d{4})Pascal', filename)
+    year_match = PASCAL_FILENAME_YEAR.search(filename)
     if year_match:
         info['Year'] = year_match.group(1)
     else:
         # Try to extract from content
-        year_match = re.search(r'(\d{4})\s+Pascal Contest', text_content)
+        year_match = PASCAL_CONTENT_YEAR.search(text_content)
         if year_match:
             info['Year'] = year_match.group(1)
     
@@ -116,69 +199,195 @@ def extract_contest_info(text_content, filename):
     
     return info
 
-def process_pascal_pdfs(directory='.'):
+def process_pascal_pdf(directory, filename, cache_dir=PAGE_CACHE_DIR):
+    """
+    Parse the Pascal Contest results out of one PDF and save them to <name>_parsed.csv
+    Returns (DataFrame or None, list of log messages) so it can run in a worker process
+    """
+    messages = []
+    pdf_path = os.path.join(directory, filename)
+    try:
+        # Stop extracting at the first page with Pascal Contest results
+        pascal_page = find_pascal_results_page(iter_pdf_pages(pdf_path, cache_dir))
+
+        if pascal_page:
+            # Extract contest information
+            contest_info = extract_contest_info(pascal_page, filename)
+
+            # Parse the results
+            parsed_df = parse_pascal_results(pascal_page)
+
+            # Only add to results if we found some data
+            if not parsed_df.empty:
+                # Add contest info as metadata
+                for key, value in contest_info.items():
+                    parsed_df[key] = value
+
+                # Add filename for reference
+                parsed_df['Source'] = filename
+
+                # Save individual result to CSV
+                csv_filename = os.path.splitext(filename)[0] + '_parsed.csv'
+                parsed_df.to_csv(os.path.join(directory, csv_filename), index=False)
+
+                year = contest_info.get('Year', 'Unknown')
+                format_type = contest_info.get('Format', 'Unknown')
+                messages.append(f"Processed {filename} ({year} Pascal Contest, {format_type}) and saved results to {csv_filename}")
+
+                # Print completion report
+                num_questions = len(parsed_df)
+                messages.append(f"  Found data for {num_questions} questions")
+                return parsed_df, messages
+            else:
+                messages.append(f"Found Pascal Contest header in {filename} but couldn't parse results")
+        else:
+            messages.append(f"No Pascal Contest results found in {filename}")
+
+    except Exception as e:
+        messages.append(f"Error processing {filename}: {e}")
+    return None, messages
+
+def process_pascal_pdfs(directory='.', workers=None, cache_dir=PAGE_CACHE_DIR):
     """
     Process all PDF files in a directory, looking for Pascal Contest results
+    Files are handled in parallel on a process pool (workers=1 processes them in this process)
     Returns a dictionary of DataFrames with parsed results
     """
     results = {}
-    
+
     # Find all PDF files
-    for filename in os.listdir(directory):
-        if filename.lower().endswith('.pdf'):
-            pdf_path = os.path.join(directory, filename)
-            try:
-                # Extract text from each page of the PDF
-                page_texts = extract_text_from_pdf(pdf_path)
-                
-                # Find the page with Pascal Contest results
-                pascal_page = find_pascal_results_page(page_texts)
-                
-                if pascal_page:
-                    # Extract contest information
-                    contest_info = extract_contest_info(pascal_page, filename)
-                    
-                    # Parse the results
-                    parsed_df = parse_pascal_results(pascal_page)
-                    
-                    # Only add to results if we found some data
-                    if not parsed_df.empty:
-                        # Add contest info as metadata
-                        for key, value in contest_info.items():
-                            parsed_df[key] = value
-                        
-                        # Add filename for reference
-                        parsed_df['Source'] = filename
-                        
-                        results[filename] = parsed_df
-                        
-                        # Save individual result to CSV
-                        csv_filename = os.path.splitext(filename)[0] + '_parsed.csv'
-                        parsed_df.to_csv(os.path.join(directory, csv_filename), index=False)
-                        
-                        year = contest_info.get('Year', 'Unknown')
-                        format_type = contest_info.get('Format', 'Unknown')
-                        print(f"Processed {filename} ({year} Pascal Contest, {format_type}) and saved results to {csv_filename}")
-                        
-                        # Print completion report
-                        num_questions = len(parsed_df)
-                        print(f"  Found data for {num_questions} questions")
-                    else:
-                        print(f"Found Pascal Contest header in {filename} but couldn't parse results")
-                else:
-                    print(f"No Pascal Contest results found in {filename}")
-                    
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-    
+    filenames = sorted(f for f in os.listdir(directory) if f.lower().endswith('.pdf'))
+    if workers == 1 or len(filenames) < 2:
+        outputs = [process_pascal_pdf(directory, f, cache_dir) for f in filenames]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(process_pascal_pdf, [directory] * len(filenames), filenames, [cache_dir] * len(filenames)))
+
+    for filename, (parsed_df, messages) in zip(filenames, outputs):
+        for message in messages:
+            print(message)
+        if parsed_df is not None:
+            results[filename] = parsed_df
+
     return results
 
+# Results pages open with e.g. "Pascal Contest Concours Pascal"
+CONTEST_HEADER = re.compile(r'^\s*([A-Z][a-z]+) Contest Concours \1\b', re.M)
+GAUSS_GRADE = re.compile(r'Grade\s*(7|8)|(7|8)\s*e\s*ann', re.I)
+RESULT_COLUMNS = ['Contest', 'Year', 'Question', 'Correct Answer', 'Percentage Correct',
+                  'Number of Contestants', 'Average Mark', 'Source']
+
+def detect_contest(page_text):
+    """
+    Name of the contest whose results are on this page (e.g. "Pascal", "Gauss7"), or None
+    """
+    header = CONTEST_HEADER.search(page_text)
+    if not header:
+        return None
+    contest = header.group(1)
+    if contest == 'Gauss':
+        # Gauss 7 and 8 share a results PDF; tell them apart by the grade on the page
+        grade = GAUSS_GRADE.search(page_text)
+        if grade:
+            contest += grade.group(1) or grade.group(2)
+    return contest
+
+def iter_results_pdf(pdf_path, cache_dir=PAGE_CACHE_DIR):
+    """
+    Read a results PDF once and yield the results of every contest it contains
+    Each row is a dict with the RESULT_COLUMNS keys
+    """
+    filename = os.path.basename(pdf_path)
+    year_match = FILENAME_YEAR.search(filename)
+    year = year_match.group(1) if year_match else None
+
+    for page_text in iter_pdf_pages(pdf_path, cache_dir):
+        if year is None:
+            # The cover page leads with the contest year
+            year_match = COVER_YEAR.search(page_text)
+            year = year_match.group(1) if year_match else None
+        contest = detect_contest(page_text)
+        if contest is None:
+            continue
+        info = extract_contest_info(page_text, filename)
+        for question_num, correct_answer, percentage_correct in iter_result_rows(page_text):
+            yield {
+                'Contest': contest,
+                'Year': year,
+                'Question': question_num,
+                'Correct Answer': correct_answer,
+                'Percentage Correct': percentage_correct,
+                'Number of Contestants': info.get('Number of Contestants'),
+                'Average Mark': info.get('Average Mark'),
+                'Source': filename,
+            }
+
+def parse_results_pdf(pdf_path, cache_dir=PAGE_CACHE_DIR):
+    """
+    List of every results row in a PDF, see iter_results_pdf()
+    """
+    return list(iter_results_pdf(pdf_path, cache_dir))
+
+def _parse_results_pdf(pdf_path, cache_dir):
+    try:
+        return parse_results_pdf(pdf_path, cache_dir), None
+    except Exception as e:
+        return [], e
+
+def process_results_pdfs(directory='.', output='all_results.csv', workers=None, cache_dir=PAGE_CACHE_DIR, contests=None, store=None):
+    """
+    Parse every contest section of every results PDF in a directory into one combined CSV
+    Each PDF is read once no matter how many contests it covers, and rows are written as
+    each PDF finishes rather than collected in memory
+    contests optionally limits the output to the given contest names
+    store (a corpus_db.CorpusStore) also receives the rows of each PDF as it finishes
+    Returns the number of rows written
+    """
+    filenames = sorted(f for f in os.listdir(directory) if f.lower().endswith('.pdf'))
+    paths = [os.path.join(directory, f) for f in filenames]
+    # The pool is shut down inside the stage so its workers' CPU time is counted
+    with metrics.stage("pdf"):
+        pool = None
+        if workers == 1 or len(paths) < 2:
+            outputs = (_parse_results_pdf(path, cache_dir) for path in paths)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            outputs = pool.map(_parse_results_pdf, paths, [cache_dir] * len(paths))
+
+        count = 0
+        try:
+            with open(os.path.join(directory, output), 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+                writer.writeheader()
+                for filename, (rows, error) in zip(filenames, outputs):
+                    if error is not None:
+                        metrics.count("pdf_errors")
+                        print(f"Error processing {filename}: {error}")
+                        continue
+                    if contests:
+                        rows = [row for row in rows if row['Contest'] in contests]
+                    found = sorted({row['Contest'] for row in rows})
+                    print(f"Processed {filename}: {len(rows)} rows for {', '.join(found) or 'no contests'}")
+                    writer.writerows(rows)
+                    if store is not None:
+                        store.upsert_results(rows)
+                        store.commit()
+                    count += len(rows)
+                    metrics.count("pdfs_parsed")
+                    metrics.count("result_rows", len(rows))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    return count
+
 def analyze_results(results):
     """
     Generate additional analysis from the parsed results
     """
     if not results:
         return
+
+    import pandas as pd
     
     # Combine all results
     combined_df = pd.concat(results.values())
@@ -207,15 +416,10 @@ def analyze_results(results):
     
     return combined_df
 
-# Example usage
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) > 1:
-        directory = sys.argv[1]
-    else:
-        directory = '.'
-    
+def analyze(directory):
+    """
+    Pascal-only pipeline: per-file parsed CSVs, printed statistics and all_pascal_results.csv
+    """
     print(f"Processing PDFs in directory: {directory}")
     results = process_pascal_pdfs(directory)
     
@@ -231,4 +435,50 @@ if __name__ == "__main__":
             combined_df.to_csv(combined_csv, index=False)
             print(f"\nCombined results saved to {combined_csv}")
     else:
-        print("No valid Pascal Contest PDF files found.")
\ No newline at end of file
+        print("No valid Pascal Contest PDF files found.")
+
+# Example usage
+#   python scrape_solution_pdf.py parse DIR [--output all_results.csv] [--contest Pascal ...]
+#   python scrape_solution_pdf.py analyze DIR
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    # A bare directory argument keeps the original behaviour
+    if len(sys.argv) < 2 or sys.argv[1] not in ('parse', 'analyze', '-h', '--help'):
+        sys.argv.insert(1, 'analyze')
+
+    parser = argparse.ArgumentParser(description="Parse CEMC results PDFs")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    parse = subcommands.add_parser('parse', help="write every contest's results to one CSV (no pandas)")
+    parse.add_argument('directory', nargs='?', default='.')
+    parse.add_argument('--output', default='all_results.csv', help="file name inside the directory")
+    parse.add_argument('--contest', nargs='+', help="only keep these contests, e.g. Pascal Cayley")
+    parse.add_argument('--workers', type=int, default=None)
+    parse.add_argument('--cache-dir', default=PAGE_CACHE_DIR)
+    parse.add_argument('--db', help="also upsert the rows into this corpus_db SQLite store")
+    parse.add_argument('--report', help="write stage timings and counters to this JSON file")
+    parse.add_argument('--profile', action='store_true', help="run the parse under cProfile (use --workers 1 to see the PDF work)")
+    parse.add_argument('--profile-dir', default='profiles')
+    analyze_parser = subcommands.add_parser('analyze', help="Pascal results with per-file CSVs and statistics (pandas)")
+    analyze_parser.add_argument('directory', nargs='?', default='.')
+    args = parser.parse_args()
+
+    if args.command == 'parse':
+        metrics.configure(['pdf'] if args.profile else [], args.profile_dir)
+        print(f"Processing results PDFs in: {args.directory}")
+        store = None
+        if args.db:
+            from corpus_db import CorpusStore
+            store = CorpusStore(args.db)
+        try:
+            count = process_results_pdfs(args.directory, args.output, args.workers, args.cache_dir, args.contest, store)
+        finally:
+            if store is not None:
+                store.close()
+        print(f"\nSaved {count} rows to {os.path.join(args.directory, args.output)}")
+        metrics.summary()
+        if args.report:
+            metrics.write(args.report)
+    else:
+        analyze(args.directory)
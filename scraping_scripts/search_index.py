@@ -0,0 +1,157 @@
+import argparse
+import json
+import math
+import re
+import time
+
+from dedupe import load_corpus, question_key, question_text
+from instrumentation import metrics
+
+# Words, numbers and TeX commands, so "\sqrt" or "\pi" can be searched for like words
+TOKEN = re.compile(r"\\[a-z]+|[a-z]+|\d+(?:\.\d+)?")
+PHRASE = re.compile(r'"([^"]+)"|(\S+)')
+SEARCH_INDEX = "contest_data/search_index.json"
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def build_search_index(files):
+    """
+    Positional inverted index over the questions and choices of the given _questions.json files
+    Returns {"docs": [key], "lengths": [token count], "postings": {token: [doc gaps, positions]}}
+    Doc ids in a posting list are gap-encoded (each is the difference from the previous one)
+    and positions[i] lists where the token occurs in the i-th doc
+    """
+    docs = []
+    lengths = []
+    postings = {}
+    with metrics.stage("search_index"):
+        for contest, record in load_corpus(files):
+            doc = len(docs)
+            docs.append(question_key(contest, record))
+            tokens = tokenize(question_text(record))
+            lengths.append(len(tokens))
+            positions = {}
+            for position, token in enumerate(tokens):
+                positions.setdefault(token, []).append(position)
+            for token, where in positions.items():
+                entry = postings.setdefault(token, [[], [], doc])
+                # The third slot holds the last doc id while building, for the gap encoding
+                entry[0].append(doc - entry[2] if entry[0] else doc)
+                entry[1].append(where)
+                entry[2] = doc
+    metrics.count("search_tokens", len(postings))
+    return {
+        "docs": docs,
+        "lengths": lengths,
+        "postings": {token: entry[:2] for token, entry in postings.items()},
+    }
+
+
+def write_search_index(files, output=SEARCH_INDEX):
+    index = build_search_index(files)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    return index
+
+
+class SearchIndex:
+    """
+    Ranked term and phrase queries over an index from build_search_index()
+    Only the posting lists of the query terms are decoded, so a query costs time in
+    proportion to the questions containing its terms, not the size of the corpus
+    """
+
+    def __init__(self, index):
+        self.docs = index["docs"]
+        self.lengths = index["lengths"]
+        self.postings = index["postings"]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        self.decoded = {}
+
+    @classmethod
+    def load(cls, path=SEARCH_INDEX):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _posting(self, token):
+        """
+        {doc id: positions} for one token
+        """
+        if token not in self.decoded:
+            gaps, positions = self.postings.get(token, ([], []))
+            docs = {}
+            doc = 0
+            for gap, where in zip(gaps, positions):
+                doc += gap
+                docs[doc] = where
+            self.decoded[token] = docs
+        return self.decoded[token]
+
+    def _phrase(self, tokens):
+        """
+        {doc id: match count} for docs where the tokens appear consecutively
+        """
+        postings = [self._posting(token) for token in tokens]
+        if not postings or any(not p for p in postings):
+            return {}
+        matches = {}
+        for doc in set.intersection(*(set(p) for p in postings)):
+            starts = set(postings[0][doc])
+            for offset, posting in enumerate(postings[1:], 1):
+                starts &= {position - offset for position in posting[doc]}
+            if starts:
+                matches[doc] = len(starts)
+        return matches
+
+    def search(self, query, limit=10):
+        """
+        Questions matching any term or "quoted phrase" of the query, best first, scored by BM25
+        Returns [(key like "pascal/2022/14", score)]
+        """
+        scores = {}
+        count = len(self.docs)
+        for phrase, word in PHRASE.findall(query):
+            tokens = tokenize(phrase or word)
+            if not tokens:
+                continue
+            matches = self._phrase(tokens) if len(tokens) > 1 else {d: len(p) for d, p in self._posting(tokens[0]).items()}
+            if not matches:
+                continue
+            idf = math.log(1 + (count - len(matches) + 0.5) / (len(matches) + 0.5))
+            for doc, frequency in matches.items():
+                norm = K1 * (1 - B + B * self.lengths[doc] / self.average_length)
+                scores[doc] = scores.get(doc, 0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.docs[doc], score) for doc, score in ranked]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the full-text question index")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    build = subcommands.add_parser("build", help="index _questions.json files")
+    build.add_argument("files", nargs="+")
+    build.add_argument("--output", default=SEARCH_INDEX)
+    query = subcommands.add_parser("query", help='e.g. clock hands, or "clock hands" for a phrase')
+    query.add_argument("query")
+    query.add_argument("--index", default=SEARCH_INDEX)
+    query.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = write_search_index(args.files, args.output)
+        print(f"Indexed {len(index['docs'])} questions ({len(index['postings'])} tokens) into {args.output}")
+    else:
+        index = SearchIndex.load(args.index)
+        start = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        elapsed = time.perf_counter() - start
+        for key, score in results:
+            print(f"{key}  {score:.2f}")
+        print(f"{len(results)} results in {elapsed * 1000:.2f}ms")
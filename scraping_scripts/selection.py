@@ -0,0 +1,163 @@
+import json
+
+import numpy as np
+
+# Weight selectNextQuestion gives questions that have no topic data
+DEFAULT_TOPIC_WEIGHT = 0.85
+MAX_TIME_FACTOR = 1.5
+
+
+class SelectionIndex:
+    """
+    NumPy view of an index written by post_processing.add_index
+
+    Questions are also grouped by topic count with running sums of their clamped difficulty
+    weight: a question none of the user's topics touch weighs that difficulty weight times a
+    factor shared by its whole group, so select_question needs only the group sums for them
+    """
+
+    def __init__(self, index):
+        columns = index["columns"]
+        self.count = index["count"]
+        self.year = np.array(columns["year"], dtype=np.int16)
+        self.number = np.array(columns["number"], dtype=np.int8)
+        self.difficulty_weight = np.array(
+            [np.nan if w is None else w for w in columns["difficulty_weight"]], dtype=np.float64
+        )
+        self.topic_count = np.array(columns["topic_count"], dtype=np.int32)
+        self.has_topics = self.topic_count > 0
+        self.postings = {topic: np.array(indices, dtype=np.int32) for topic, indices in index["postings"].items()}
+        # Negative and missing difficulty weights never get picked, whatever the factor
+        self.base_weight = np.maximum(
+            np.nan_to_num(self.difficulty_weight, nan=0.0, posinf=0.0, neginf=0.0), 0.0
+        )
+        self.groups = []
+        for topic_count in np.unique(self.topic_count):
+            members = np.flatnonzero(self.topic_count == topic_count)
+            self.groups.append((int(topic_count), members, np.cumsum(self.base_weight[members])))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+
+def _topic_totals(index, stats):
+    """
+    (questions, accuracy, time): the sorted questions on the posting lists of topics the user
+    has stats for, with their summed per-topic accuracy and time
+    """
+    updates = []
+    for topic, topic_stats in stats.get("topicStats", {}).items():
+        postings = index.postings.get(str(topic))
+        if postings is None or not topic_stats.get("total"):
+            continue
+        updates.append((postings, topic_stats["correct"] / topic_stats["total"], topic_stats["time"] / topic_stats["total"]))
+    if not updates:
+        return np.zeros(0, dtype=np.int32), np.zeros(0), np.zeros(0)
+    questions = np.unique(np.concatenate([postings for postings, _, _ in updates]))
+    accuracy = np.zeros(len(questions))
+    time = np.zeros(len(questions))
+    for postings, topic_accuracy, topic_time in updates:
+        # A topic tagged twice on one question is counted twice, as in getQuestionTopics
+        positions = np.searchsorted(questions, postings)
+        np.add.at(accuracy, positions, topic_accuracy)
+        np.add.at(time, positions, topic_time)
+    return questions, accuracy, time
+
+
+def _overall_time(stats):
+    return stats.get("time", 0) / (stats.get("total") or 1)
+
+
+def _combine(index, rows, accuracy, time, overall_time):
+    """
+    selectNextQuestion's weight for the given rows from their summed topic accuracy and time
+    """
+    has_topics = index.has_topics[rows]
+    count = np.maximum(index.topic_count[rows], 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        topic_weight = np.where(has_topics, 1 - accuracy / count, DEFAULT_TOPIC_WEIGHT)
+        time_factor = np.where(has_topics, np.minimum(MAX_TIME_FACTOR, (1 + time) / count / overall_time), 1.0)
+    weights = topic_weight * index.difficulty_weight[rows] * time_factor
+    # Near-certain questions (over ~99.3% correct) get a negative difficulty weight; never pick them
+    return np.maximum(np.nan_to_num(weights, nan=0.0, posinf=0.0, neginf=0.0), 0.0)
+
+
+def _group_factor(topic_count, overall_time):
+    """
+    Weight per unit of base weight of a question in the group that no user topic touches
+    """
+    if topic_count == 0:
+        return DEFAULT_TOPIC_WEIGHT
+    with np.errstate(divide="ignore"):
+        factor = min(MAX_TIME_FACTOR, np.float64(1) / topic_count / overall_time)
+    return max(float(factor), 0.0)
+
+
+def question_weights(index, stats):
+    """
+    Weight of every question for a user, matching selectNextQuestion in api/getQuestion
+
+    `stats` has the site's Stats shape: {"total", "time", "topicStats": {topic id: {"total", "correct", "time"}}}
+    Topics the user has no stats for contribute zero accuracy and zero time, as on the site
+    The result has one weight per question, so this is linear in the corpus size; select_question
+    avoids the full vector
+    """
+    questions, accuracy, time = _topic_totals(index, stats)
+    all_accuracy = np.zeros(index.count)
+    all_time = np.zeros(index.count)
+    all_accuracy[questions] = accuracy
+    all_time[questions] = time
+    return _combine(index, slice(None), all_accuracy, all_time, _overall_time(stats))
+
+
+def _pick_untouched(index, members, cumulative, touched, target):
+    """
+    Member of a topic-count group at base-weight offset `target`, counted over the members
+    that are not in `touched` (sorted question indices of the group)
+    """
+    # Move the target past every touched member that starts at or before it
+    for position in np.searchsorted(members, touched):
+        weight = index.base_weight[members[position]]
+        if cumulative[position] - weight > target:
+            break
+        target += weight
+    return int(members[min(np.searchsorted(cumulative, target, side="right"), len(members) - 1)])
+
+
+def select_question(index, stats, rng=None):
+    """
+    Weighted random choice of a question index (a position in <contest>_questions.json "data"),
+    with the probabilities of question_weights
+
+    Only the questions on the posting lists of the user's topics are weighted one by one; every
+    other question is reached through its topic-count group's precomputed sums, so the cost
+    grows with the user's topics rather than with the number of questions
+    """
+    rng = rng or np.random.default_rng()
+    overall_time = _overall_time(stats)
+    touched, accuracy, time = _topic_totals(index, stats)
+    touched_cumulative = np.cumsum(_combine(index, touched, accuracy, time, overall_time))
+    touched_total = touched_cumulative[-1] if len(touched) else 0.0
+
+    groups = []
+    for topic_count, members, cumulative in index.groups:
+        group_touched = touched[index.topic_count[touched] == topic_count]
+        untouched = max(cumulative[-1] - index.base_weight[group_touched].sum(), 0.0)
+        factor = _group_factor(topic_count, overall_time)
+        groups.append((untouched * factor, factor, members, cumulative, group_touched))
+
+    total = touched_total + sum(mass for mass, *_ in groups)
+    if total <= 0:
+        return int(rng.integers(index.count))
+    target = rng.random() * total
+    if target < touched_total:
+        return int(touched[np.searchsorted(touched_cumulative, target, side="right")])
+    target -= touched_total
+    heavy = [group for group in groups if group[0] > 0]
+    for i, (mass, factor, members, cumulative, group_touched) in enumerate(heavy):
+        # Rounding can leave the target just past the last group's mass
+        if target < mass or i == len(heavy) - 1:
+            return _pick_untouched(index, members, cumulative, group_touched, min(target, mass) / factor)
+        target -= mass
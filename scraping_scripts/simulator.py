@@ -0,0 +1,195 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from post_processing import build_index
+from selection import DEFAULT_TOPIC_WEIGHT, MAX_TIME_FACTOR, SelectionIndex
+
+# Variants of selectNextQuestion to compare; "site" is what api/getQuestion does today
+POLICIES = {
+    "site": {},
+    "uniform": {"uniform": True},
+    "no_time_factor": {"max_time_factor": 1.0},
+    "no_difficulty": {"difficulty": False},
+    "time_cap_3": {"max_time_factor": 3.0},
+    "untagged_0.5": {"default_topic_weight": 0.5},
+}
+
+
+def policy_settings(overrides=None):
+    settings = {
+        "uniform": False,
+        "default_topic_weight": DEFAULT_TOPIC_WEIGHT,
+        "max_time_factor": MAX_TIME_FACTOR,
+        "difficulty": True,
+    }
+    settings.update(overrides or {})
+    return settings
+
+
+class Corpus:
+    """
+    Dense arrays the simulation needs, built from a SelectionIndex
+    membership[q, t] counts how often topic t is listed on question q (primary and secondary
+    both count, as in getQuestionTopics)
+    """
+
+    def __init__(self, index, percentage_correct):
+        self.count = index.count
+        topics = max((int(t) for t in index.postings), default=0) + 1
+        self.membership = np.zeros((index.count, topics))
+        for topic, postings in index.postings.items():
+            np.add.at(self.membership[:, int(topic)], postings, 1)
+        self.topic_count = np.maximum(index.topic_count, 1).astype(np.float64)
+        self.has_topics = index.has_topics
+        self.difficulty_weight = np.nan_to_num(index.difficulty_weight, nan=0.0)
+        # Missing percentages are treated as a middling 50% for how hard the question plays
+        pct = np.array([50.0 if p is None else min(max(p, 1.0), 99.0) for p in percentage_correct])
+        self.ease = np.log(pct / (100 - pct))
+
+    @classmethod
+    def load(cls, questions_file):
+        with open(questions_file, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+        index = build_index(questions)
+        return cls(SelectionIndex(index), index["columns"]["percentage_correct"])
+
+
+def batch_weights(corpus, correct, total, topic_time, time_spent, answered, settings):
+    """
+    selectNextQuestion's weight of every question for every learner at once, as (learners x questions)
+    The per-topic stats arrays are (learners x topics)
+    """
+    if settings["uniform"]:
+        return np.ones((len(correct), corpus.count))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = np.where(total > 0, correct / total, 0.0)
+        per_topic_time = np.where(total > 0, topic_time / total, 0.0)
+        question_accuracy = accuracy @ corpus.membership.T / corpus.topic_count
+        question_time = (1 + per_topic_time @ corpus.membership.T) / corpus.topic_count
+        overall_time = time_spent / np.maximum(answered, 1)
+        time_factor = np.minimum(settings["max_time_factor"], question_time / overall_time[:, None])
+    topic_weight = np.where(corpus.has_topics, 1 - question_accuracy, settings["default_topic_weight"])
+    time_factor = np.where(corpus.has_topics, time_factor, 1.0)
+    difficulty = corpus.difficulty_weight if settings["difficulty"] else 1.0
+    weights = topic_weight * difficulty * time_factor
+    return np.maximum(np.nan_to_num(weights, nan=0.0, posinf=0.0, neginf=0.0), 0.0)
+
+
+def simulate(corpus, learners=1000, steps=50, policy=None, seed=0, learning_rate=0.15, skill_spread=1.0):
+    """
+    Replay a selection policy for many synthetic learners in lock step
+
+    Each learner has a skill per topic (logits, normal around 0 with `skill_spread`) and a pace
+    A question is answered correctly with probability sigmoid(mean skill over its topics +
+    logit of its percentage_correct); answering it raises the learner's skill on its topics by
+    learning_rate * (1 - that probability), so weak topics gain the most. Time per question
+    is longer for harder questions and slower learners. Stats are kept the way the site keeps them
+
+    Returns a dict with:
+      - coverage: mean share of the corpus each learner saw
+      - repeat_rate: share of draws that were questions the learner had already seen
+      - accuracy_curve: mean correctness per step
+      - skill_gain: mean skill increase over all topics
+      - weak_topic_gain: mean increase on each learner's three weakest topics (that appear in the corpus)
+    """
+    settings = policy_settings(policy)
+    rng = np.random.default_rng(seed)
+    topics = corpus.membership.shape[1]
+    present = corpus.membership.sum(axis=0) > 0
+
+    skill = rng.normal(0, skill_spread, size=(learners, topics))
+    initial = skill.copy()
+    pace = rng.lognormal(0, 0.3, size=learners)
+    correct = np.zeros((learners, topics))
+    total = np.zeros((learners, topics))
+    topic_time = np.zeros((learners, topics))
+    time_spent = np.zeros(learners)
+    seen = np.zeros((learners, corpus.count), dtype=bool)
+    repeats = 0
+    accuracy_curve = []
+    rows = np.arange(learners)
+    tagged = corpus.membership / corpus.topic_count[:, None]
+
+    for step in range(steps):
+        # Every learner has answered `step` questions so far
+        weights = batch_weights(corpus, correct, total, topic_time, time_spent, np.full(learners, step), settings)
+        cumulative = np.cumsum(weights, axis=1)
+        totals = cumulative[:, -1]
+        draw = rng.random(learners) * totals
+        chosen = (cumulative <= draw[:, None]).sum(axis=1)
+        # A learner whose weights are all zero gets a uniform pick, like select_question
+        empty = totals <= 0
+        chosen[empty] = rng.integers(corpus.count, size=empty.sum())
+        chosen = np.minimum(chosen, corpus.count - 1)
+
+        repeats += seen[rows, chosen].sum()
+        seen[rows, chosen] = True
+
+        picked = corpus.membership[chosen]
+        mean_skill = np.where(
+            corpus.has_topics[chosen],
+            (skill * tagged[chosen]).sum(axis=1),
+            skill[:, present].mean(axis=1),
+        )
+        probability = 1 / (1 + np.exp(-(mean_skill + corpus.ease[chosen])))
+        outcome = rng.random(learners) < probability
+        minutes = pace * (1.5 + 1.5 * (1 - 1 / (1 + np.exp(-corpus.ease[chosen])))) * rng.lognormal(0, 0.2, size=learners)
+
+        total += picked
+        correct += picked * outcome[:, None]
+        topic_time += picked * minutes[:, None]
+        time_spent += minutes
+        skill += learning_rate * (1 - probability)[:, None] * (picked > 0)
+        accuracy_curve.append(float(outcome.mean()))
+
+    weakest = np.argsort(np.where(present, initial, np.inf), axis=1)[:, :3]
+    gain = skill - initial
+    return {
+        "coverage": float(seen.sum(axis=1).mean() / corpus.count),
+        "repeat_rate": float(repeats / (learners * steps)),
+        "accuracy_curve": accuracy_curve,
+        "skill_gain": float(gain[:, present].mean()),
+        "weak_topic_gain": float(np.take_along_axis(gain, weakest, axis=1).mean()),
+    }
+
+
+def compare(corpus, policies, learners, steps, seed=0):
+    """
+    Simulate every policy with the same learners and print one line per policy
+    Returns {policy name: simulate() result plus sessions_per_second}
+    """
+    results = {}
+    for name, overrides in policies.items():
+        start = time.perf_counter()
+        result = simulate(corpus, learners, steps, overrides, seed)
+        result["sessions_per_second"] = learners / (time.perf_counter() - start)
+        results[name] = result
+        curve = result["accuracy_curve"]
+        print(f"{name:16} coverage {result['coverage']:.3f}  repeats {result['repeat_rate']:.3f}  "
+              f"accuracy {np.mean(curve[:5]):.2f}->{np.mean(curve[-5:]):.2f}  "
+              f"skill +{result['skill_gain']:.2f} (weakest +{result['weak_topic_gain']:.2f})  "
+              f"{result['sessions_per_second']:.0f} sessions/s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate learners against variants of the question selector")
+    parser.add_argument("questions_file")
+    parser.add_argument("--learners", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=50, help="questions per learner session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--policy", nargs="+", choices=sorted(POLICIES), help="default: all of them")
+    parser.add_argument("--variants", help='JSON of extra policies, e.g. {"cap2": {"max_time_factor": 2}}')
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    policies = {name: POLICIES[name] for name in (args.policy or POLICIES)}
+    if args.variants:
+        policies.update(json.loads(args.variants))
+    results = compare(Corpus.load(args.questions_file), policies, args.learners, args.steps, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
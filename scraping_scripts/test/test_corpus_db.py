@@ -0,0 +1,29 @@
+import os
+import shutil
+
+import pytest
+
+from corpus_db import CorpusStore
+from post_processing import migrate_to_registry
+
+PASCAL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contest_data", "pascal")
+
+
+@pytest.mark.skipif(not os.path.isdir(PASCAL), reason="no pascal data")
+def test_registry_questions_file_round_trips(tmp_path):
+    source = tmp_path / "source"
+    shutil.copytree(PASCAL, source)
+    questions_file = str(source / "pascal_questions.json")
+    migrate_to_registry([questions_file], str(tmp_path / "topics.json"))
+
+    exported = str(tmp_path / "pascal_questions.json")
+    shutil.copy(questions_file, exported)
+    with CorpusStore(str(tmp_path / "corpus.sqlite")) as store:
+        store.import_questions_file("pascal", questions_file)
+        store.export_questions("pascal", exported)
+
+    with open(questions_file, encoding="utf-8") as f:
+        expected = f.read()
+    with open(exported, encoding="utf-8") as f:
+        assert f.read() == expected
+    assert '"primaryMask"' in expected
@@ -0,0 +1,74 @@
+import io
+import json
+import os
+
+import pytest
+
+from json_stream import JsonArrayReader, JsonArrayWriter, detect_indent
+
+QUESTIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contest_data", "pascal", "pascal_questions.json")
+
+DOCUMENTS = [
+    {"data": []},
+    {"data": [], "legend": {}},
+    {"data": [1, 2.5, -3e-7, True, None, "a \"quoted\" \\ string", "café ☃"]},
+    {"data": [{"a": [1, {"b": []}], "c": {}}, [], [[]]], "legend": {"x": 1}, "sources": {"2021": "abc"}},
+    {"data": [{"question": "x" * 5000, "number": 12345.678}] * 3, "tail": [1, 2, 3]},
+]
+
+
+def write(document, indent):
+    out = io.StringIO()
+    writer = JsonArrayWriter(out, indent=indent)
+    for element in document["data"]:
+        writer.write(element)
+    writer.close({k: v for k, v in document.items() if k != "data"})
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("indent", [None, 2, 4])
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_writer_matches_json_dump(document, indent):
+    assert write(document, indent) == json.dumps(document, indent=indent)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_reader_matches_json_load(document, chunk_size):
+    for indent in (None, 2):
+        reader = JsonArrayReader(io.StringIO(json.dumps(document, indent=indent)), chunk_size=chunk_size)
+        assert list(reader) == document["data"]
+        assert reader.members == {k: v for k, v in document.items() if k != "data"}
+
+
+def test_members_before_the_array():
+    reader = JsonArrayReader(io.StringIO('{"legend": {"a": 1}, "data": [1, 2]}'))
+    assert list(reader) == [1, 2]
+    assert reader.members == {"legend": {"a": 1}}
+
+
+def test_truncated_document_raises():
+    with pytest.raises(ValueError):
+        list(JsonArrayReader(io.StringIO('{"data": [1, 2'), chunk_size=4))
+
+
+@pytest.mark.skipif(not os.path.exists(QUESTIONS), reason="no questions file")
+def test_round_trip_questions_file():
+    with open(QUESTIONS, encoding="utf-8") as f:
+        text = f.read()
+    document = json.loads(text)
+    reader = JsonArrayReader(io.StringIO(text), chunk_size=4096)
+    out = io.StringIO()
+    writer = JsonArrayWriter(out, indent=2)
+    for element in reader:
+        writer.write(element)
+    writer.close(reader.members)
+    assert out.getvalue() == json.dumps(document, indent=2)
+
+
+@pytest.mark.parametrize("indent", [None, 2, 4])
+def test_detect_indent(tmp_path, indent):
+    path = tmp_path / "questions.json"
+    path.write_text(json.dumps(DOCUMENTS[3], indent=indent), encoding="utf-8")
+    assert detect_indent(path) == indent
+    assert detect_indent(tmp_path / "missing.json", default=2) == 2
@@ -0,0 +1,43 @@
+import glob
+import os
+
+import pytest
+
+import lxml_parser
+import scrape_question
+
+# Pascal pages reconstructed from pascal_questions.json (see fixtures/README.md), so these tests
+# show the engines agree on that markup, not on the live CEMC pages
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+CONTEST_PAGES = sorted(glob.glob(os.path.join(FIXTURES, "*", "*Contest.html")))
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+@pytest.mark.parametrize("contest_path", CONTEST_PAGES, ids=os.path.basename)
+def test_engines_parse_identically(contest_path):
+    name = os.path.basename(contest_path)
+    year = int(name[:4])
+    contest = name[4:-len("Contest.html")].lower()
+    pages = scrape_question.CONTESTS[contest]
+    solution_path = contest_path.replace(pages["contest"], pages["solution"])
+    contest_html = read(contest_path)
+    solution_html = read(solution_path)
+
+    bs4_questions = scrape_question.parse_questions(contest_html, year)
+    lxml_questions = lxml_parser.parse_questions(contest_html, year)
+    assert len(bs4_questions) == 25
+    assert lxml_questions == bs4_questions
+
+    bs4_solutions = scrape_question.parse_solutions(solution_html, pages["solution_index"])
+    lxml_solutions = lxml_parser.parse_solutions(solution_html, pages["solution_index"])
+    assert len(bs4_solutions) == 25
+    assert lxml_solutions == bs4_solutions
+
+
+def test_engines_share_answer_pattern():
+    assert scrape_question.ANSWER_PATTERN is lxml_parser.ANSWER_PATTERN
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+import pytest
+
+from problem_sets import generate_sets, load_questions
+
+QUESTIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contest_data", "pascal", "pascal_questions.json")
+
+pytestmark = pytest.mark.skipif(not os.path.exists(QUESTIONS), reason="no questions file")
+
+
+@pytest.fixture(scope="module")
+def questions():
+    return load_questions(QUESTIONS)
+
+
+def test_shared_weights_match_a_broadcast_matrix(questions):
+    weights = np.linspace(0.5, 2, len(questions))
+    shared = generate_sets(questions, 20, seed=3, weights=weights)
+    matrix = generate_sets(questions, 20, seed=3, weights=np.tile(weights, (20, 1)))
+    assert (shared == matrix).all()
+
+
+def test_weight_rows_personalise_each_set(questions):
+    years = np.array([q["source"]["year"] for q in questions])
+    first, second = np.unique(years)[:2]
+    # Learner 0 only gets the first year, learner 1 only the second
+    weights = np.stack([years == first, years == second]).astype(float)
+    sets = generate_sets(questions, 2, seed=0, weights=weights)
+    assert set(years[sets[0]]) == {first}
+    assert set(years[sets[1]]) == {second}
+    for row in sets:
+        assert len(set(row)) == 25
+
+
+def test_weight_rows_must_match(questions):
+    with pytest.raises(ValueError):
+        generate_sets(questions, 3, weights=np.ones((2, len(questions))))
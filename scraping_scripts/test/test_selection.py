@@ -0,0 +1,45 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from post_processing import build_index
+from selection import SelectionIndex, question_weights, select_question
+
+QUESTIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contest_data", "pascal", "pascal_questions.json")
+
+pytestmark = pytest.mark.skipif(not os.path.exists(QUESTIONS), reason="no questions file")
+
+
+class GridRng:
+    """
+    Returns the midpoints of `n` equal steps of [0, 1), so each question is picked
+    within one of n times its probability
+    """
+
+    def __init__(self, n):
+        self.values = iter((np.arange(n) + 0.5) / n)
+
+    def random(self):
+        return next(self.values)
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open(QUESTIONS, encoding="utf-8") as f:
+        return SelectionIndex(build_index(json.load(f)))
+
+
+@pytest.mark.parametrize("weak_topics", [0, 3, None])
+def test_select_question_follows_question_weights(index, weak_topics):
+    topics = sorted(index.postings, key=int)[:weak_topics]
+    stats = {
+        "total": 40, "time": 1200,
+        "topicStats": {t: {"total": 5 + i, "correct": i % 4, "time": 40.0 * (i + 1)} for i, t in enumerate(topics)},
+    }
+    weights = question_weights(index, stats)
+    n = 4000
+    rng = GridRng(n)
+    picks = np.bincount([select_question(index, stats, rng) for _ in range(n)], minlength=index.count)
+    assert np.abs(picks - weights / weights.sum() * n).max() < 1 + 1e-6
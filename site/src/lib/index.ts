@@ -53,7 +53,8 @@ function processHTMLBlock(html: string) {
 
 function processAnswer(html: string) {
 	html = html.replaceAll(/\\mbox/g,"\\text");
-	if(html.includes("img")){
+	// Images and answers pre-rendered to MathML at build time are already HTML
+	if(html.includes("img") || html.startsWith("<math")){
 		return html
 	}
 	return math(remove(remove(html, '\\('), '\\)'));
@@ -24,11 +24,18 @@ type SequenceQuestion = {
 		number: number;
 	};
 };
+type GradingContext = {
+	question: string;
+	solution: string;
+	chars: number;
+	tokens: number;
+}
 type SubQuestion = {
 	solution: string;
 	type: "full" | "short";
 	html:string;
 	points: number;
+	grading?: GradingContext;
 }
 type ContestFile = {
 	data: Question[];
@@ -65,4 +72,4 @@ interface SequenceStats {
 	time: number;
 }
 
-export type {Question, SubQuestion, SequenceQuestion,Stats,TopicStats,SequenceStats, ContestDirectory}
\ No newline at end of file
+export type {Question, SubQuestion, GradingContext, SequenceQuestion,Stats,TopicStats,SequenceStats, ContestDirectory}
\ No newline at end of file
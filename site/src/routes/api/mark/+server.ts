@@ -50,9 +50,12 @@ export const POST: RequestHandler = async ({ request, params, url }: RequestEven
 	let results = []
 	for (let i = 0; i < body.answers.length; i++) {
 		if (body.answers[i]) {
+			// Plain-text context from grading_context.py when the build has it, much shorter than the HTML
+			const question = questions[i].grading?.question ?? questions[i].html;
+			const solution = questions[i].grading?.solution ?? questions[i].solution;
 			const prompt =
 				(questions[i].type == 'full' ? fullAnswer : shortAnswer) +
-				`This question is worth ${questions[i].points} marks. The question is ${questions[i].html}. The correct solution is ${questions[i].solution}. The answer given by the user is ${body.answers[i]}. Do not award partial marks for just submitting  numerical answer.`;
+				`This question is worth ${questions[i].points} marks. The question is ${question}. The correct solution is ${solution}. The answer given by the user is ${body.answers[i]}. Do not award partial marks for just submitting  numerical answer.`;
 			const result = await model.generateContent(prompt);
 			results.push(JSON.parse(result.response.text()));
 		}